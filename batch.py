@@ -0,0 +1,305 @@
+# batch.py Vectorized rollouts of many games of Napoleon at St. Helena at once
+'''
+A Batch holds K games in NumPy arrays and plays one move in every game
+at each step, so a policy can be tried on thousands of deals for the
+cost of a few array operations a move:
+
+    piles       (K, 20, 104) card codes of each pile by pile number, bottom
+                first, with NOCARD above the top card
+    lengths     (K, 20) number of cards in each pile
+    passNumber  (K,) 1 or 2
+
+The stock is always face down except for its top card, which can be
+played, and the waste only takes the top of the stock, as in model.py.
+
+Only single-card moves are made.  These are exactly the moves of one
+card that Model.play allows, since the supermove limit is never below
+one, but the moves of several cards at once are left out, so the
+rollouts play well below the same policies on a Model, which can move
+whole sequences.  They are for comparing policies, not the game.  A
+move is the action  source*20 + destination, and turning the stock
+over for the second pass, model.NEXTPASS, is  WASTE*20 + STOCK.
+
+Legal moves are found by comparing the top card of every source with
+the top card of every destination through the tables of state.py: a
+card goes on a tableau pile when its successor is that pile's top card
+(Card.__lt__), and on a foundation when it is the successor of the top.
+
+This module needs NumPy, which the rest of the program does not.
+
+    python batch.py --deals 10000 --policy greedy
+'''
+import time
+import numpy as np
+from model import Model, TABLEAU, FOUNDATIONS, STOCK, WASTE
+from state import State, FACE, NEXT, RANK, NOFACE, PILES
+
+NOCARD = 255
+DEPTH = 104
+ACTIONS = PILES * PILES
+PASSACTION = WASTE * PILES + STOCK
+MAXMOVES = 1000
+
+# The tables of state.py as arrays, extended so that NOCARD (and NOFACE)
+# look up as NOFACE.
+def _table(values):
+    table = np.full(256, NOFACE, dtype=np.uint8)
+    table[:len(values)] = np.frombuffer(values, dtype=np.uint8)
+    return table
+
+FACES = _table(FACE)
+NEXTS = _table(NEXT)
+RANKS = np.zeros(256, dtype=np.uint8)
+RANKS[:len(RANK)] = np.frombuffer(RANK, dtype=np.uint8)
+
+TABLEAUX = np.array(TABLEAU)
+FOUNDATIONS_ = np.array(FOUNDATIONS)
+SOURCES = np.array(list(TABLEAU) + [STOCK, WASTE])
+
+class Batch:
+    '''
+    K games in arrays, as described above.
+    '''
+    def __init__(self, piles, lengths, passNumber, numbers=None):
+        self.piles = piles
+        self.lengths = lengths
+        self.passNumber = passNumber
+        self.numbers = numbers
+        self.rows = np.arange(len(lengths))
+
+    @classmethod
+    def fromDeals(cls, numbers):
+        '''
+        A batch of the deals with the given numbers (see Model.deal).
+        '''
+        numbers = np.asarray(numbers)
+        k = len(numbers)
+        piles = np.full((k, PILES, DEPTH), NOCARD, dtype=np.uint8)
+        lengths = np.zeros((k, PILES), dtype=np.int16)
+        model = Model(0, 0, 0)
+        for row, number in enumerate(numbers):
+            model.deal(int(number))
+            for n, pile in enumerate(State.fromModel(model).piles()):
+                piles[row, n, :len(pile)] = np.frombuffer(bytes(pile), dtype=np.uint8)
+                lengths[row, n] = len(pile)
+        return cls(piles, lengths, np.ones(k, dtype=np.int8), numbers)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def tops(self):
+        '''
+        (K, 20) code of the top card of each pile, NOCARD if it is empty.
+        '''
+        top = np.maximum(self.lengths - 1, 0)
+        cards = np.take_along_axis(self.piles, top[:, :, None].astype(np.intp), axis=2)[:, :, 0]
+        return np.where(self.lengths > 0, cards, NOCARD)
+
+    def home(self):
+        '''
+        (K,) number of cards on the foundations.
+        '''
+        return self.lengths[:, FOUNDATIONS_].sum(axis=1)
+
+    def won(self):
+        return self.home() == 104
+
+    def legal(self):
+        '''
+        (K, 20, 20) mask of the legal single-card moves, by source and
+        destination pile, with NEXTPASS at [WASTE, STOCK].
+        '''
+        k = len(self)
+        tops = self.tops()
+        lengths = self.lengths
+        faces, nexts = FACES[tops], NEXTS[tops]
+        mask = np.zeros((k, PILES, PILES), dtype=bool)
+        present = np.zeros((k, PILES), dtype=bool)
+        present[:, SOURCES] = lengths[:, SOURCES] > 0
+        # onto a tableau pile: the card's successor is the top there, or it is empty
+        t = TABLEAUX
+        builds = nexts[:, SOURCES, None] == faces[:, None, t]
+        builds &= faces[:, None, t] != NOFACE
+        builds |= (lengths[:, None, t] == 0)
+        mask[:, SOURCES[:, None], t[None, :]] = builds & present[:, SOURCES, None]
+        # onto a foundation: the card is the successor of the top, or an Ace on an empty one
+        f = FOUNDATIONS_
+        ups = nexts[:, None, f] == faces[:, SOURCES, None]
+        ups &= lengths[:, None, f] > 0
+        ups |= (lengths[:, None, f] == 0) & (RANKS[tops[:, SOURCES]] == 1)[:, :, None]
+        mask[:, SOURCES[:, None], f[None, :]] = ups & present[:, SOURCES, None]
+        mask[:, t, t] = False
+        # the top of the stock to the waste, or the waste back to the stock
+        mask[:, STOCK, WASTE] = lengths[:, STOCK] > 0
+        mask[:, WASTE, STOCK] = (lengths[:, STOCK] == 0) & (self.passNumber == 1)
+        return mask
+
+    def step(self, actions, active=None):
+        '''
+        Make the move  actions[k]  in game k, for the games where active
+        (a boolean mask) is True, or all of them.  The moves must be legal.
+        '''
+        rows = self.rows if active is None else self.rows[active]
+        actions = np.asarray(actions)[rows]
+        source, dest = actions // PILES, actions % PILES
+        turn = actions == PASSACTION
+        if turn.any():
+            self.turnOver(rows[turn])
+            rows, source, dest = rows[~turn], source[~turn], dest[~turn]
+        piles, lengths = self.piles, self.lengths
+        top = lengths[rows, source] - 1
+        cards = piles[rows, source, top]
+        piles[rows, source, top] = NOCARD
+        lengths[rows, source] = top
+        pos = lengths[rows, dest]
+        piles[rows, dest, pos] = cards
+        lengths[rows, dest] = pos + 1
+
+    def turnOver(self, rows):
+        '''
+        Turn the waste over onto the stock in the given games.
+        '''
+        piles, lengths = self.piles, self.lengths
+        n = lengths[rows, WASTE].astype(np.intp)
+        depth = np.arange(DEPTH)
+        # stock position p gets waste position n-1-p
+        src = np.clip(n[:, None] - 1 - depth[None, :], 0, DEPTH-1)
+        waste = piles[rows, WASTE]
+        turned = np.take_along_axis(waste, src, axis=1)
+        piles[rows, STOCK] = np.where(depth[None, :] < n[:, None], turned, NOCARD)
+        piles[rows, WASTE] = NOCARD
+        lengths[rows, STOCK] = n
+        lengths[rows, WASTE] = 0
+        self.passNumber[rows] += 1
+
+    def useful(self, mask):
+        '''
+        Remove from mask the moves that can only lead back to an earlier
+        position, as simulate.usefulMoves does: moving a card off the
+        card it is already built on, and moving a lone card from one
+        tableau pile to an empty one.
+        '''
+        piles, lengths = self.piles, self.lengths
+        t = TABLEAUX
+        n = lengths[:, t]
+        top = np.take_along_axis(piles[:, t], np.maximum(n - 1, 0)[:, :, None].astype(np.intp), axis=2)[:, :, 0]
+        under = np.take_along_axis(piles[:, t], np.maximum(n - 2, 0)[:, :, None].astype(np.intp), axis=2)[:, :, 0]
+        built = (n >= 2) & (NEXTS[top] == FACES[under])
+        alone = n == 1
+        empty = n == 0
+        tt = mask[:, t[:, None], t[None, :]]
+        tt &= ~built[:, :, None]
+        tt &= ~(alone[:, :, None] & empty[:, None, :])
+        mask[:, t[:, None], t[None, :]] = tt
+        return mask
+
+    def take(self, rows):
+        '''
+        A new batch of copies of the games selected by rows.
+        '''
+        numbers = None if self.numbers is None else self.numbers[rows]
+        return Batch(self.piles[rows], self.lengths[rows], self.passNumber[rows], numbers)
+
+    def put(self, rows, other):
+        '''
+        Copy the games of other back into the games selected by rows.
+        '''
+        self.piles[rows] = other.piles
+        self.lengths[rows] = other.lengths
+        self.passNumber[rows] = other.passNumber
+
+def noise(rng, shape, bits):
+    '''
+    Random integers below 2**bits, cheaply, for breaking ties.
+    '''
+    size = int(np.prod(shape))
+    return (np.frombuffer(rng.bytes(size), dtype=np.uint8) >> (8 - bits)).reshape(shape)
+
+def randomPolicy(batch, mask, rng):
+    '''
+    A legal move chosen uniformly in each game.
+    '''
+    flat = mask.reshape(len(batch), ACTIONS)
+    return np.argmax(np.where(flat, noise(rng, flat.shape, 8).astype(np.int16) + 1, 0), axis=1)
+
+# Scores of the moves for greedyPolicy, by source and destination.  As in
+# simulate.greedyPolicy: to a foundation, then building in the tableau,
+# then to an empty pile, then turning the stock.  The scores are scaled
+# by TIES, and random numbers below TIES added, to break ties.
+TIES = 8
+_GREEDY = np.zeros((PILES, PILES), dtype=np.int16)
+_GREEDY[:, list(FOUNDATIONS)] = 5 * TIES
+_GREEDY[np.ix_(list(TABLEAU) + [STOCK, WASTE], list(TABLEAU))] = 4 * TIES
+_GREEDY[STOCK, WASTE] = 1 * TIES
+_GREEDY[WASTE, STOCK] = 0
+_TABLEAU = np.zeros(PILES, dtype=np.int16)
+_TABLEAU[list(TABLEAU)] = 1
+
+def greedyPolicy(batch, mask, rng):
+    '''
+    The best move by the scores above in each game, ties broken at random.
+    '''
+    k = len(batch)
+    empty = (batch.lengths == 0) * _TABLEAU
+    alone = (batch.lengths == 1) * _TABLEAU
+    # building on an empty pile is worth less, and so is emptying a pile
+    score = (_GREEDY - (2 * TIES) * empty[:, None, :]
+                     - TIES * (alone[:, :, None] * _TABLEAU[None, None, :]))
+    score = score.reshape(k, ACTIONS) + noise(rng, (k, ACTIONS), 3)
+    return np.argmax(np.where(mask.reshape(k, ACTIONS), score, -1), axis=1)
+
+POLICIES = {'random' : randomPolicy, 'greedy' : greedyPolicy}
+
+COMPACT = 0.75      # drop the finished games when fewer than this fraction are left
+
+def rollout(batch, policy, rng, maxMoves=MAXMOVES):
+    '''
+    Play every game of batch to the end with policy(batch, mask, rng),
+    which returns one action per game.  Return (won, first pass won,
+    moves), arrays with one entry per game.  Finished games are dropped
+    from the arrays being stepped from time to time, and copied back to
+    batch at the end.
+    '''
+    moves = np.zeros(len(batch), dtype=np.int32)
+    live = np.arange(len(batch))    # rows of batch in play
+    games = batch
+    for step in range(maxMoves):
+        mask = games.useful(games.legal())
+        active = mask.reshape(len(games), ACTIONS).any(axis=1) & ~games.won()
+        if active.sum() < COMPACT * len(games):
+            if games is not batch:
+                batch.put(live, games)
+            live = live[active]
+            if not len(live):
+                break
+            games = games.take(active)
+            mask = mask[active]
+            active = None
+        games.step(policy(games, mask, rng), active)
+        moves[live if active is None else live[active]] += 1
+    if games is not batch and len(live):
+        batch.put(live, games)
+    won = batch.won()
+    return won, won & (batch.passNumber == 1), moves
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Play many Napoleon at St. Helena deals at once.')
+    parser.add_argument('--deals', type=int, default=10000, help='number of deals to play')
+    parser.add_argument('--start', type=int, default=0, help='number of the first deal')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='greedy')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the policy\'s generator')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    batch = Batch.fromDeals(range(args.start, args.start + args.deals))
+    dealt = time.perf_counter()
+    won, first, moves = rollout(batch, POLICIES[args.policy], np.random.default_rng(args.seed))
+    seconds = time.perf_counter() - dealt
+    deals = len(batch)
+    print('dealt %d deals in %.1f seconds, played them in %.1f seconds, %.0f deals/second'%(
+        deals, dealt - start, seconds, deals / seconds))
+    print('won %d (%.2f%%), first pass %d (%.2f%%), %.0f moves a game'%(
+        won.sum(), 100*won.mean(), first.sum(), 100*first.mean(), moves.mean()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# bench.py Benchmarks for the hot paths of Napoleon at St. Helena
+'''
+Time the model and view operations that run on every move, and write the
+results as JSON so that runs on different commits can be compared.
+
+    python bench.py --json before.json
+    ... change something ...
+    python bench.py --json after.json
+    python bench.py --compare before.json after.json
+
+Every benchmark replays the same traces: games played to the end by the
+greedy policy of simulate.py from fixed deal numbers, so the positions are the
+ones real games go through, supermoves and second passes included.  Each
+benchmark runs a number of times with garbage collection off, and the
+best and median times per operation are reported.
+
+The view benchmark needs a display.  On a headless machine run it under
+a virtual one, for example  xvfb-run python bench.py ; if Tk cannot start
+the view benchmark is skipped.
+'''
+import argparse, gc, json, platform, statistics, sys, time
+from model import Model, Card, NEXTPASS
+import simulate
+
+SEEDS = range(20)
+REPEAT = 5
+THRESHOLD = 0.10       # report changes larger than this fraction
+
+def makeTraces(seeds=SEEDS):
+    '''
+    Return a list of (seed, moves) for greedy games of the deals 
+    numbered seeds.
+    '''
+    model = Model(0, 0, 0)
+    traces = []
+    for seed in seeds:
+        simulate.playDeal(model, seed, simulate.greedyPolicy)
+        traces.append((seed, list(model.history())))
+    return traces
+
+def startDeal(model, seed):
+    model.deal(seed)
+
+class Timer:
+    '''
+    Accumulates the time spent in a section of code, and a count of
+    how often it ran.
+    '''
+    def __init__(self):
+        self.seconds = 0.0
+        self.count = 0
+
+    def add(self, start):
+        self.seconds += time.perf_counter() - start
+        self.count += 1
+
+# Each benchmark takes the traces and returns a dict of name -> Timer.
+
+def benchDeal(traces):
+    model = Model(0, 0, 0)
+    deal, shuffle = Timer(), Timer()
+    for seed, moves in traces:
+        start = time.perf_counter()
+        model.deal(seed)
+        deal.add(start)
+        start = time.perf_counter()
+        model.shuffle()
+        shuffle.add(start)
+    return {'Model.deal' : deal, 'Model.shuffle' : shuffle}
+
+def benchMoves(traces):
+    '''
+    Replay the traces through grab, canDrop and completeMove, as the view
+    does.  canDrop is also tried on every other drop pile first, as
+    happens when the dragged cards overlap more than one pile.
+    '''
+    model = Model(0, 0, 0)
+    timers = {name : Timer() for name in
+              ('Model.grab', 'Model.canDrop', 'Model.completeMove', 'Model.gameOver', 'Model.nextPass')}
+    grab, canDrop, complete, over, turn = (timers[name] for name in
+              ('Model.grab', 'Model.canDrop', 'Model.completeMove', 'Model.gameOver', 'Model.nextPass'))
+    for seed, moves in traces:
+        startDeal(model, seed)
+        for move in moves:
+            if move == NEXTPASS:
+                start = time.perf_counter()
+                model.nextPass()
+                turn.add(start)
+                continue
+            source, count, dest = move
+            pile, target = model.piles[source], model.piles[dest]
+            start = time.perf_counter()
+            model.grab(pile, len(pile) - count)
+            grab.add(start)
+            for other in model.dropPiles:
+                if other is not target:
+                    start = time.perf_counter()
+                    dropped = model.canDrop(other)
+                    canDrop.add(start)
+                    if dropped:
+                        del other[-count:]
+            start = time.perf_counter()
+            model.canDrop(target)
+            canDrop.add(start)
+            start = time.perf_counter()
+            model.completeMove(target)
+            complete.add(start)
+            start = time.perf_counter()
+            model.gameOver()
+            over.add(start)
+    return timers
+
+def benchDescending(traces):
+    '''
+    Card.isDescending on every suffix of every tableau pile, after each
+    move, as TableauPile.canSelect would see them.
+    '''
+    model = Model(0, 0, 0)
+    timer = Timer()
+    isDescending = Card.isDescending
+    for seed, moves in traces:
+        startDeal(model, seed)
+        for move in moves:
+            model.play(move)
+            for pile in model.tableau:
+                for idx in range(len(pile)):
+                    seq = pile[idx:]
+                    start = time.perf_counter()
+                    isDescending(seq)
+                    timer.add(start)
+    return {'Card.isDescending' : timer}
+
+class _Parent:
+    '''
+    Stands in for the Napoleon application, which owns the model and view.
+    '''
+    def __init__(self, model):
+        self.model = model
+
+    def showHelp(self, event):
+        pass
+
+    def recordGame(self):
+        pass
+
+    def totals(self):
+        model = self.model
+        return model.games, model.wins, model.first
+
+def benchView(traces, deck):
+    '''
+    Replay the traces through View.show, with Tk running on whatever
+    display is available.  Return {} if Tk cannot start.
+    '''
+    import tkinter as tk
+    from view import View
+    model = Model(0, 0, 0)
+    try:
+        view = View(_Parent(model), lambda: None, deck, width=950, height=1000)
+    except tk.TclError as e:
+        print('skipping view benchmark: %s'%e, file=sys.stderr)
+        return {}
+    show, showPile = Timer(), Timer()
+    original = view.showPile
+    def timedShowPile(*args):
+        start = time.perf_counter()
+        original(*args)
+        showPile.add(start)
+    view.showPile = timedShowPile
+    try:
+        for seed, moves in traces:
+            startDeal(model, seed)
+            for move in [None] + moves:
+                if move is not None:
+                    model.play(move)
+                start = time.perf_counter()
+                view.show()
+                view.root.update_idletasks()
+                show.add(start)
+    finally:
+        view.root.destroy()
+    return {'View.show' : show, 'View.showPile' : showPile}
+
+BENCHMARKS = [benchDeal, benchMoves, benchDescending]
+
+def run(traces, repeat=REPEAT, view=True, deck=None):
+    '''
+    Run every benchmark repeat times.  Return a dict of name -> results.
+    '''
+    benchmarks = list(BENCHMARKS)
+    if view:
+        benchmarks.append(lambda traces: benchView(traces, deck))
+    samples = {}
+    counts = {}
+    for bench in benchmarks:
+        bench(traces)      # warm up
+        for k in range(repeat):
+            gc.collect()
+            gc.disable()
+            try:
+                timers = bench(traces)
+            finally:
+                gc.enable()
+            for name, timer in timers.items():
+                if timer.count:
+                    samples.setdefault(name, []).append(timer.seconds / timer.count)
+                    counts[name] = timer.count
+    return {name : {'best_us' : 1e6*min(times),
+                    'median_us' : 1e6*statistics.median(times),
+                    'calls' : counts[name]}
+            for name, times in samples.items()}
+
+def compare(old, new, threshold=THRESHOLD):
+    '''
+    Print the change in median time for each benchmark in both results.
+    Return the number of benchmarks that got slower by more than threshold.
+    '''
+    slower = 0
+    print('%-22s %12s %12s %8s'%('benchmark', 'old us', 'new us', 'change'))
+    for name in sorted(set(old['results']) & set(new['results'])):
+        before = old['results'][name]['median_us']
+        after = new['results'][name]['median_us']
+        change = (after - before) / before if before else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  slower'
+            slower += 1
+        elif change < -threshold:
+            flag = '  faster'
+        print('%-22s %12.3f %12.3f %+7.1f%%%s'%(name, before, after, 100*change, flag))
+    return slower
+
+def main(argv=None):
+    import os
+    parser = argparse.ArgumentParser(description='Benchmark Napoleon at St. Helena.')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='runs of each benchmark')
+    parser.add_argument('--seeds', type=int, default=len(SEEDS), help='number of games to replay')
+    parser.add_argument('--no-view', dest='view', action='store_false', help='skip the view benchmark')
+    parser.add_argument('--deck', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'decks', 'small'))
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args = parser.parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        return 1 if compare(old, new) else 0
+    traces = makeTraces(range(args.seeds))
+    results = run(traces, args.repeat, args.view, args.deck)
+    report = {'python' : platform.python_version(),
+              'platform' : platform.platform(),
+              'seeds' : args.seeds,
+              'moves' : sum(len(moves) for seed, moves in traces),
+              'results' : results}
+    for name in sorted(results):
+        r = results[name]
+        print('%-22s best %10.3f us  median %10.3f us  (%d calls)'%(name, r['best_us'], r['median_us'], r['calls']))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
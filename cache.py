@@ -0,0 +1,226 @@
+# cache.py Persistent cache of solver results for Napoleon at St. Helena
+'''
+Solving a position takes seconds, and the same positions are solved
+again and again: the hint for a position the player has undone back to,
+a deal played a second time, a batch run done over.  A SolverCache keeps
+what the solver found in an SQLite database, keyed by the Zobrist hash
+of the position (see solver.py), with the number of the deal when the
+position is the start of one.
+
+Since the hash is by face, the two copies of a card count as the same
+card, and each entry also holds the position with its cards written as
+faces, which is compared on lookup so a collision can never give a wrong
+answer.  A win is kept with its line, and the positions along the first
+few moves of the line are stored too, so that the player who follows a
+hint finds the next one waiting.  A search that ran out of budget is
+kept with the best line it found and the budget it had, and is only
+used again by a search whose budget is no larger.
+
+Entries belong to a version of the rules (RULES below), and entries
+from any other version are dropped when the database is opened, so the
+string must be changed whenever the rules in model.py change.  The
+database holds at most a given number of entries; when it grows past
+that the least recently used tenth are dropped.  In front of it is a
+dictionary of the entries used most recently, which answers most
+lookups without going to the database at all.  Reads that hit, and new
+entries, are written in batches.
+'''
+import sqlite3, threading, time
+from array import array
+from collections import OrderedDict
+from state import State, HEADER, FACE
+from solver import Search, Result, TranspositionTable, zobrist, WON, UNKNOWN
+
+RULES = 'napoleon-1 supermove=2**empty,half-to-empty passes=2 waste=stock-only'
+
+CAPACITY = 200000        # entries kept in the database
+MEMORY = 4096            # entries kept in memory
+BATCH = 64               # writes queued before they go to the database
+PREFIX = 16              # positions stored along a winning line
+UNLIMITED = -1           # a budget of nodes or seconds with no limit
+
+FACES = FACE + bytes(256 - len(FACE))     # translation table, code -> face
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS results (
+    hash INTEGER PRIMARY KEY,     -- Zobrist hash, as a signed 64-bit integer
+    rules TEXT NOT NULL,
+    deal INTEGER,                 -- deal number, if this is the start of one
+    position BLOB NOT NULL,       -- the State, with codes written as faces
+    status TEXT NOT NULL,
+    moves BLOB NOT NULL,          -- the line, three bytes a move
+    nodes INTEGER NOT NULL,       -- used, or for an unknown result the budget
+    seconds REAL NOT NULL,        -- (UNLIMITED for none)
+    used INTEGER NOT NULL         -- larger is more recent
+);
+CREATE INDEX IF NOT EXISTS resultsDeal ON results(deal);
+CREATE INDEX IF NOT EXISTS resultsUsed ON results(used);
+'''
+
+def signed(h):
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+def canonical(state):
+    data = state.data
+    return bytes(data[:HEADER]) + bytes(data[HEADER:]).translate(FACES)
+
+def packMoves(moves):
+    return array('B', (n for move in moves for n in move)).tobytes()
+
+def unpackMoves(data):
+    return [tuple(data[k:k+3]) for k in range(0, len(data), 3)]
+
+class SolverCache:
+    '''
+    The cache in the database at path.  It may be used from several
+    threads.  Call close() when finished, to write what is queued.
+    '''
+    def __init__(self, path, capacity=CAPACITY, memory=MEMORY, rules=RULES):
+        self.capacity = capacity
+        self.memory = memory
+        self.rules = rules
+        self.recent = OrderedDict()     # hash -> (position, status, moves, nodes, seconds)
+        self.pending = {}               # hash -> row to write, or None to touch used
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        with self.db:
+            self.db.executescript(SCHEMA)
+            self.db.execute('DELETE FROM results WHERE rules != ?', (rules,))
+        self.used = self.db.execute('SELECT coalesce(max(used), 0) FROM results').fetchone()[0]
+        self.hits = self.misses = 0
+
+    def get(self, position, maxNodes=None, maxSeconds=None):
+        '''
+        Return a solver.Result for position (a State) if one is cached
+        that a search with the given budget could not improve on, else
+        None.  A win or a loss is always good enough; a search that ran
+        out of budget is only if it had at least as much of each kind.
+        '''
+        start = time.perf_counter()
+        piles = position.piles()
+        h = zobrist(piles, position.passNumber)
+        key = canonical(position)
+        with self.lock:
+            entry = self.recent.get(h)
+            if entry is None:
+                row = self.db.execute('SELECT position, status, moves, nodes, seconds FROM results '
+                                      'WHERE hash = ?', (signed(h),)).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1], unpackMoves(row[2]), row[3], row[4])
+            if entry is None or entry[0] != key or not self.goodEnough(entry, maxNodes, maxSeconds):
+                self.misses += 1
+                return None
+            self.remember(h, entry)
+            self.pending.setdefault(h, None)
+            self.hits += 1
+            if len(self.pending) >= BATCH:
+                self.flush()
+        _, status, moves, nodes, seconds = entry
+        return Result(status, moves if status == WON else [], 0, time.perf_counter() - start, 0,
+                      TranspositionTable(0), moves)
+
+    @staticmethod
+    def goodEnough(entry, maxNodes, maxSeconds):
+        status, nodes, seconds = entry[1], entry[3], entry[4]
+        if status != UNKNOWN:
+            return True
+        def covers(had, wanted):
+            return had == UNLIMITED or (wanted is not None and had >= wanted)
+        return covers(nodes, maxNodes) and covers(seconds, maxSeconds)
+
+    def put(self, position, result, deal=None, maxNodes=None, maxSeconds=None):
+        '''
+        Store the result of solving position (a State), which is the
+        start of the numbered deal if deal is given, by a search with
+        the given budget.  A search that ran out of budget is stored
+        with the budget it had, not what it used of it, since it stopped
+        when it ran out of one kind with some of the other left.
+        '''
+        line = result.moves if result.status == WON else result.best
+        nodes, seconds = result.nodes, result.seconds
+        if result.status == UNKNOWN:
+            nodes = UNLIMITED if maxNodes is None else maxNodes
+            seconds = UNLIMITED if maxSeconds is None else maxSeconds
+        with self.lock:
+            self.store(position, result.status, line, nodes, seconds, deal)
+            if result.status == WON:
+                # the positions along the line, with the rest of the line
+                search = Search(position.piles(), position.passNumber)
+                for k, move in enumerate(line[:PREFIX]):
+                    search.make(move)
+                    if search.won():
+                        break
+                    state = State.fromPiles(search.piles, search.passNumber)
+                    self.store(state, WON, line[k+1:], result.nodes, result.seconds, None)
+            if len(self.pending) >= BATCH:
+                self.flush()
+
+    def store(self, position, status, moves, nodes, seconds, deal):
+        h = zobrist(position.piles(), position.passNumber)
+        entry = (canonical(position), status, list(moves), nodes, seconds)
+        self.remember(h, entry)
+        self.pending[h] = (deal,) + entry
+
+    def remember(self, h, entry):
+        recent = self.recent
+        recent[h] = entry
+        recent.move_to_end(h)
+        if len(recent) > self.memory:
+            recent.popitem(last=False)
+
+    def lookupDeal(self, number):
+        '''
+        Return (status, moves) cached for the start of deal  number, or
+        None.
+        '''
+        with self.lock:
+            self.flush()
+            row = self.db.execute('SELECT status, moves FROM results WHERE deal = ?',
+                                  (number,)).fetchone()
+        return None if row is None else (row[0], unpackMoves(row[1]))
+
+    def flush(self):
+        '''
+        Write the queued entries and uses, and drop the least recently
+        used entries if there are too many.  The caller holds the lock.
+        '''
+        if not self.pending:
+            return
+        rows, touched = [], []
+        for h, row in self.pending.items():
+            self.used += 1
+            if row is None:
+                touched.append((self.used, signed(h)))
+            else:
+                deal, position, status, moves, nodes, seconds = row
+                rows.append((signed(h), self.rules, deal, position, status, packMoves(moves),
+                             nodes, seconds, self.used))
+        self.pending = {}
+        with self.db:
+            if rows:
+                # a deal number, once known, is kept
+                self.db.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                                    'ON CONFLICT(hash) DO UPDATE SET '
+                                    'deal = coalesce(excluded.deal, deal), position = excluded.position, '
+                                    'status = excluded.status, moves = excluded.moves, '
+                                    'nodes = excluded.nodes, seconds = excluded.seconds, '
+                                    'used = excluded.used', rows)
+            if touched:
+                self.db.executemany('UPDATE results SET used = ? WHERE hash = ?', touched)
+            count = self.db.execute('SELECT count(*) FROM results').fetchone()[0]
+            if count > self.capacity:
+                drop = count - self.capacity + self.capacity // 10
+                self.db.execute('DELETE FROM results WHERE hash IN '
+                                '(SELECT hash FROM results ORDER BY used LIMIT ?)', (drop,))
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.db.close()
+
+    def __len__(self):
+        with self.lock:
+            self.flush()
+            return self.db.execute('SELECT count(*) FROM results').fetchone()[0]
@@ -0,0 +1,209 @@
+# env.py Reinforcement learning environments for Napoleon at St. Helena
+'''
+Environments in the style of Gym for training agents on the rules of
+model.py.  NapoleonEnv plays one game, and VectorEnv plays many at once
+in the arrays of batch.py, stepping them all with a few array operations
+and no Python objects for each game or move.
+
+An action is a move of one card,  source*20 + destination  by pile
+number, or ACTIONS-2 = PASSACTION (model.NEXTPASS) to turn the stock
+over, as in batch.py.  The moves of several cards that Model allows are
+each the same as a series of moves of one card through the empty
+tableau piles, or onto the foundations one at a time, so every position
+the game can reach can still be reached.  The legal actions are given
+as a mask of ACTIONS booleans, in info['mask'] and by legalMask().
+
+An observation is OBSERVATION bytes of card codes (see model.Card),
+with NOCARD for no card:
+
+    [0:160]     the tableau, TABLEAUDEPTH cards from the bottom of each pile
+    [160:168]   the top card of each foundation, which tells the rest
+    [168:232]   the waste, bottom first
+    232         the top card of the stock (the others are face down)
+    233         the number of cards in the stock
+    234         the pass number
+
+A tableau pile is what is left of the four cards dealt to it, with a
+sequence in suit built down from the top of those, or a sequence alone,
+so it never holds more than 4 + 12 cards.  The reward is the number of
+cards a move puts on the foundations.  A game ends (terminated) when it
+is won or there is no legal action, and is cut off (truncated) after
+maxMoves moves, since moves back and forth can go on for ever.
+
+This module needs NumPy, as batch.py does.
+
+    env = NapoleonEnv()
+    observation, info = env.reset(seed=1)
+    observation, reward, terminated, truncated, info = env.step(action)
+'''
+import numpy as np
+from model import DEALS, FOUNDATIONS, STOCK, WASTE, NEXTPASS
+from batch import Batch, ACTIONS, PASSACTION, MAXMOVES
+from state import PILES
+
+TABLEAUDEPTH = 16
+WASTEDEPTH = 64          # the cards not dealt to the tableau
+OBSERVATION = 10*TABLEAUDEPTH + 8 + WASTEDEPTH + 3
+
+_FOUNDATIONS = slice(10*TABLEAUDEPTH, 10*TABLEAUDEPTH + 8)
+_WASTE = slice(_FOUNDATIONS.stop, _FOUNDATIONS.stop + WASTEDEPTH)
+_STOCKTOP, _STOCKSIZE, _PASS = range(_WASTE.stop, _WASTE.stop + 3)
+
+def moveOf(action):
+    '''
+    The move of model.py made by an action.
+    '''
+    if action == PASSACTION:
+        return NEXTPASS
+    return (action // PILES, 1, action % PILES)
+
+def actionOf(move):
+    '''
+    The action for a move of model.py, which must be of one card.
+    '''
+    if move == NEXTPASS:
+        return PASSACTION
+    source, count, dest = move
+    if count != 1:
+        raise ValueError('only moves of one card are actions')
+    return source * PILES + dest
+
+def observe(batch, out=None):
+    '''
+    The observations of the games of batch, in out if given.
+    '''
+    if out is None:
+        out = np.empty((len(batch), OBSERVATION), dtype=np.uint8)
+    piles, lengths = batch.piles, batch.lengths
+    out[:, :_FOUNDATIONS.start] = piles[:, :10, :TABLEAUDEPTH].reshape(len(batch), -1)
+    tops = batch.tops()
+    out[:, _FOUNDATIONS] = tops[:, list(FOUNDATIONS)]
+    out[:, _WASTE] = piles[:, WASTE, :WASTEDEPTH]
+    out[:, _STOCKTOP] = tops[:, STOCK]
+    out[:, _STOCKSIZE] = lengths[:, STOCK]
+    out[:, _PASS] = batch.passNumber
+    return out
+
+class VectorEnv:
+    '''
+    count games played at once.  Each step takes an action for every
+    game, and a game that ends is dealt afresh at once, so the
+    observation returned for it is of its new deal; info['deals'] has
+    the deal number of each game.  Deals are drawn at random from a
+    generator seeded by seed, unless reset() is given them.
+    '''
+    def __init__(self, count, seed=None, maxMoves=MAXMOVES):
+        self.count = count
+        self.maxMoves = maxMoves
+        self.rng = np.random.default_rng(seed)
+        self.batch = None
+        self.mask = None
+        self.moves = np.zeros(count, dtype=np.int32)
+        self.observations = np.empty((count, OBSERVATION), dtype=np.uint8)
+
+    def reset(self, seed=None, deals=None):
+        '''
+        Deal new games.  Return (observations, info).
+        '''
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        if deals is None:
+            deals = self.rng.integers(DEALS, size=self.count)
+        self.batch = Batch.fromDeals(deals)
+        self.moves[:] = 0
+        self.mask = self.batch.legal().reshape(self.count, ACTIONS)
+        return observe(self.batch, self.observations), self.info()
+
+    def legalMask(self):
+        '''
+        (count, ACTIONS) mask of the legal actions in each game.
+        '''
+        return self.mask
+
+    def info(self):
+        return {'mask' : self.mask, 'deals' : self.batch.numbers}
+
+    def step(self, actions):
+        '''
+        Make one legal action in every game.  Return (observations,
+        rewards, terminated, truncated, info), one entry per game.
+        '''
+        batch = self.batch
+        actions = np.asarray(actions, dtype=np.intp)
+        if not self.mask[batch.rows, actions].all():
+            raise ValueError('illegal action')
+        home = batch.home()
+        batch.step(actions)
+        rewards = (batch.home() - home).astype(np.float32)
+        self.moves += 1
+        self.mask = batch.legal().reshape(self.count, ACTIONS)
+        terminated = batch.won() | ~self.mask.any(axis=1)
+        truncated = ~terminated & (self.moves >= self.maxMoves)
+        ended = np.flatnonzero(terminated | truncated)
+        if len(ended):
+            self.redeal(ended)
+        return observe(batch, self.observations), rewards, terminated, truncated, self.info()
+
+    def redeal(self, rows):
+        fresh = Batch.fromDeals(self.rng.integers(DEALS, size=len(rows)))
+        self.batch.put(rows, fresh)
+        self.batch.numbers[rows] = fresh.numbers
+        self.moves[rows] = 0
+        self.mask[rows] = fresh.legal().reshape(len(rows), ACTIONS)
+
+class NapoleonEnv:
+    '''
+    One game.  reset(seed) deals a game chosen at random by a generator
+    seeded by seed, or the given deal; after the game ends, reset() must
+    be called before the next step.
+    '''
+    def __init__(self, seed=None, maxMoves=MAXMOVES):
+        self.maxMoves = maxMoves
+        self.rng = np.random.default_rng(seed)
+        self.batch = None
+        self.mask = None
+        self.moves = 0
+        self.over = True
+
+    def reset(self, seed=None, deal=None):
+        '''
+        Deal a new game.  Return (observation, info).
+        '''
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        if deal is None:
+            deal = int(self.rng.integers(DEALS))
+        self.batch = Batch.fromDeals([deal])
+        self.moves = 0
+        self.over = False
+        self.mask = self.batch.legal().reshape(ACTIONS)
+        return observe(self.batch)[0], self.info()
+
+    def legalMask(self):
+        '''
+        Mask of the ACTIONS actions, True for the legal ones.
+        '''
+        return self.mask
+
+    def info(self):
+        return {'mask' : self.mask, 'deal' : int(self.batch.numbers[0])}
+
+    def step(self, action):
+        '''
+        Make a legal action.  Return (observation, reward, terminated,
+        truncated, info).
+        '''
+        if self.over:
+            raise RuntimeError('the game is over; call reset()')
+        if not 0 <= action < ACTIONS or not self.mask[action]:
+            raise ValueError('illegal action %r'%action)
+        batch = self.batch
+        home = int(batch.home()[0])
+        batch.step(np.array([action]))
+        reward = float(batch.home()[0] - home)
+        self.moves += 1
+        self.mask = batch.legal().reshape(ACTIONS)
+        terminated = bool(batch.won()[0]) or not self.mask.any()
+        truncated = not terminated and self.moves >= self.maxMoves
+        self.over = terminated or truncated
+        return observe(batch)[0], reward, terminated, truncated, self.info()
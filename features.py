@@ -0,0 +1,204 @@
+# features.py Deal features of Napoleon at St. Helena, for ranking deals by difficulty
+'''
+Work out features of the layout of numbered deals, and how the greedy
+policy of batch.py fares on them, for any number of deals, and write
+them to a directory of columns:
+
+    schema.json     the columns, their types and files, and the number
+                    of rows written so far
+    <column>.bin    the values of one column, one after another,
+                    little-endian, with nothing else in the file
+
+so a column can be read on its own, straight into an array (see load).
+The columns are in COLUMNS.  Positions in the stock count from its top,
+the card dealt first, which is 0.
+
+The deals are cut into chunks, and each chunk is worked out by a worker
+process, on the arrays of a batch.Batch.  Only a few chunks are out at
+a time, and each is appended to the files as soon as it and the ones
+before it are done, so the memory used does not grow with the number of
+deals.  schema.json is rewritten after every chunk, so a run that is
+stopped can be run again to carry on where it left off.
+
+This module needs NumPy, as batch.py does.
+
+    python features.py deals/ --deals 1000000
+    python features.py deals/ --deals 2000000     # again: 1000000 more
+'''
+import json, os, sys, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from model import ACE, KING, STOCK
+from batch import Batch, FACES, NEXTS, RANKS, rollout, greedyPolicy
+
+FORMAT = 'napoleon-features-1'
+CHUNK = 1000         # deals a worker does at a time
+NONE = 255           # firstStockAce when there is no ace in the stock
+
+# name, type, description
+COLUMNS = (
+    ('deal', 'uint32', 'deal number (see Model.deal)'),
+    ('topAces', 'uint8', 'Aces on top of a tableau pile'),
+    ('buriedAces', 'uint8', 'Aces in the tableau under other cards'),
+    ('aceDepth', 'uint8', 'cards on top of the Aces in the tableau'),
+    ('runs', 'uint8', 'cards in the tableau on their successor (same suit, one rank higher)'),
+    ('coveringKings', 'uint8', 'Kings in the tableau on top of other cards'),
+    ('stockAces', 'uint8', 'Aces in the stock'),
+    ('firstStockAce', 'uint8', 'position of the first Ace in the stock, 255 if none'),
+    ('stockAceDepth', 'uint16', 'sum of the positions of the Aces in the stock'),
+    ('greedyWon', 'uint8', '1 if the greedy policy won'),
+    ('greedyFirst', 'uint8', '1 if the greedy policy won on the first pass'),
+    ('greedyMoves', 'uint16', 'moves the greedy policy made'),
+    ('greedyHome', 'uint8', 'cards the greedy policy put on the foundations'),
+)
+
+def features(start, count):
+    '''
+    The columns for the deals numbered from start to start+count-1, as
+    a dictionary of arrays.
+    '''
+    batch = Batch.fromDeals(np.arange(start, start + count))
+    tableau = batch.piles[:, :10, :4]         # as dealt, bottom first
+    ranks = RANKS[tableau]
+    aces = ranks == ACE
+    stock = batch.piles[:, STOCK, :64]
+    stockAces = RANKS[stock] == ACE
+    position = np.arange(63, -1, -1)          # from the top of the stock
+    columns = {
+        'deal' : batch.numbers,
+        'topAces' : aces[:, :, 3].sum(axis=1),
+        'buriedAces' : aces[:, :, :3].sum(axis=(1, 2)),
+        'aceDepth' : (aces * np.arange(3, -1, -1)).sum(axis=(1, 2)),
+        'runs' : (NEXTS[tableau[:, :, 1:]] == FACES[tableau[:, :, :-1]]).sum(axis=(1, 2)),
+        'coveringKings' : (ranks[:, :, 1:] == KING).sum(axis=(1, 2)),
+        'stockAces' : stockAces.sum(axis=1),
+        'firstStockAce' : np.where(stockAces, position, NONE).min(axis=1),
+        'stockAceDepth' : (stockAces * position).sum(axis=1),
+    }
+    won, first, moves = rollout(batch, greedyPolicy, np.random.default_rng(start))
+    columns.update(greedyWon=won, greedyFirst=first, greedyMoves=moves, greedyHome=batch.home())
+    return {name : np.asarray(columns[name]).astype(np.dtype(kind).newbyteorder('<'))
+            for name, kind, _ in COLUMNS}
+
+def _chunk(start, count):
+    return {name : values.tobytes() for name, values in features(start, count).items()}
+
+class ColumnWriter:
+    '''
+    The columns in directory path, which is created if need be.  If it
+    already holds columns, their rows are kept and new rows go after them.
+    '''
+    def __init__(self, path, start=0):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        schema = os.path.join(path, 'schema.json')
+        self.rows = 0
+        self.start = start
+        if os.path.exists(schema):
+            with open(schema) as infile:
+                old = json.load(infile)
+            if old['format'] != FORMAT or [c['name'] for c in old['columns']] != [c[0] for c in COLUMNS]:
+                raise ValueError('%s holds other columns'%path)
+            self.rows, self.start = old['rows'], old['start']
+        self.files = {}
+        for name, kind, _ in COLUMNS:
+            f = open(os.path.join(path, name + '.bin'), 'ab')
+            # drop anything written after the last chunk recorded
+            f.truncate(self.rows * np.dtype(kind).itemsize)
+            self.files[name] = f
+        self.writeSchema()
+
+    def append(self, chunk, rows):
+        for name, data in chunk.items():
+            self.files[name].write(data)
+        for f in self.files.values():
+            f.flush()
+        self.rows += rows
+        self.writeSchema()
+
+    def writeSchema(self):
+        schema = {'format' : FORMAT, 'start' : self.start, 'rows' : self.rows,
+                  'columns' : [{'name' : name, 'type' : kind, 'file' : name + '.bin',
+                                'description' : description}
+                               for name, kind, description in COLUMNS]}
+        path = os.path.join(self.path, 'schema.json')
+        with open(path + '.tmp', 'w') as outfile:
+            json.dump(schema, outfile, indent=1)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+def extract(path, deals, start=0, chunk=CHUNK, processes=None, report=sys.stderr):
+    '''
+    Write the features of deals numbered from start up to the columns
+    at path, until it holds  deals  rows.  Return the rows written.
+    '''
+    writer = ColumnWriter(path, start)
+    first = writer.start + writer.rows
+    stop = writer.start + deals
+    window = deque()         # (rows, future) in order of deal number
+    done = 0
+    begun = last = time.perf_counter()
+    try:
+        limit = 2 * (processes or os.cpu_count() or 1)
+        with ProcessPoolExecutor(processes) as pool:
+            for number in range(first, stop, chunk):
+                rows = min(chunk, stop - number)
+                window.append((rows, pool.submit(_chunk, number, rows)))
+                while len(window) >= limit or (window and window[0][1].done()):
+                    rows, future = window.popleft()
+                    writer.append(future.result(), rows)
+                    done += rows
+                now = time.perf_counter()
+                if report and now - last >= 5.0:
+                    last = now
+                    print('%d of %d deals, %.0f deals/second'%(done, stop - first, done/(now-begun)),
+                          file=report)
+            while window:
+                rows, future = window.popleft()
+                writer.append(future.result(), rows)
+                done += rows
+    finally:
+        writer.close()
+    return done
+
+def load(path):
+    '''
+    Return the schema of the columns at path, and a dictionary of the
+    columns as arrays mapped from their files.
+    '''
+    with open(os.path.join(path, 'schema.json')) as infile:
+        schema = json.load(infile)
+    columns = {}
+    for column in schema['columns']:
+        kind = np.dtype(column['type']).newbyteorder('<')
+        if schema['rows']:
+            columns[column['name']] = np.memmap(os.path.join(path, column['file']), dtype=kind,
+                                                mode='r', shape=(schema['rows'],))
+        else:
+            columns[column['name']] = np.zeros(0, dtype=kind)
+    return schema, columns
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Extract features of Napoleon at St. Helena deals.')
+    parser.add_argument('path', help='directory of columns')
+    parser.add_argument('--deals', type=int, default=100000, help='rows wanted in all')
+    parser.add_argument('--start', type=int, default=0, help='number of the first deal')
+    parser.add_argument('--chunk', type=int, default=CHUNK, help='deals a worker does at a time')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: all cores)')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    done = extract(args.path, args.deals, args.start, args.chunk, args.processes)
+    seconds = time.perf_counter() - start
+    print('%d deals in %.1f seconds, %.0f deals/second'%(done, seconds, done/seconds if seconds else 0))
+    schema, columns = load(args.path)
+    if schema['rows']:
+        print('%d rows: greedy won %.2f%%, %.2f buried Aces a deal'%(
+            schema['rows'], 100*columns['greedyWon'].mean(), columns['buriedAces'].mean()))
+
+if __name__ == "__main__":
+    main()
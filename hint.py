@@ -0,0 +1,127 @@
+# hint.py Background hints for Napoleon at St. Helena
+'''
+The hint engine runs the solver in a worker process, on a snapshot of
+the position taken as a state.State, so the model can go on changing
+while it works.  The worker sends the best move it has found so far
+through a queue whenever that changes, and the view polls the queue
+with root.after, so the Tk main loop is never kept waiting.
+
+Every search belongs to a generation.  Starting a new search, because
+the position changed, sets the old worker's stop event, which it sees
+at its next check, and bumps the generation, and anything the old
+worker still sends is ignored.
+
+A process is used rather than a thread because the solver is pure
+Python and holds the interpreter lock while it runs.  Tkinter gives up
+the lock around every call into Tcl and has to take it back, so with
+the solver in a thread every canvas call waits behind it, and drawing
+and dragging stall.  The worker opens the cache database itself, since
+an SQLite connection cannot be shared between processes.  Call close()
+before the program ends, so that a worker is not cut off while it is
+writing to the cache.
+'''
+import multiprocessing, queue, time
+from cache import SolverCache
+from solver import Solver, legalMoves
+from state import State
+
+HINT_SECONDS = 5.0      # search budget for each position
+CLOSE_SECONDS = 2.0     # longest close() waits for the workers to stop
+
+SEARCHING = 'searching'
+
+def _search(state, generation, stopped, messages, seconds, cachePath):
+    '''
+    The worker process.
+    '''
+    post = messages.put
+    def progress(line):
+        post((generation, line[0], SEARCHING))
+    cache = None if cachePath is None else SolverCache(cachePath)
+    try:
+        solver = Solver(maxSeconds=seconds, stop=stopped.is_set, progress=progress, cache=cache)
+        result = solver.solve(state)
+    finally:
+        if cache is not None:
+            cache.close()
+    if result.best:
+        move = result.best[0]
+    else:
+        # nothing gets a card home, so suggest what the solver tries first
+        moves = legalMoves(state.piles(), state.passNumber)
+        move = moves[0] if moves else None
+    post((generation, move, result.status))
+
+class HintEngine:
+    '''
+    Runs the solver on the positions it is given.  If cache (the path
+    of a cache.SolverCache database) is given, positions solved before
+    are answered from it at once.
+    '''
+    def __init__(self, seconds=HINT_SECONDS, cache=None):
+        self.seconds = seconds
+        self.cache = cache
+        self.messages = multiprocessing.Queue()
+        self.workers = []         # processes that may still be running
+        self.generation = 0
+        self.stopped = None       # Event that stops the current worker
+        self.move = None          # best first move for the current generation
+        self.status = None        # SEARCHING, or the solver's verdict
+
+    def start(self, model):
+        '''
+        Stop any search in progress and start one on model's position.
+        '''
+        self.cancel()
+        self.generation += 1
+        self.move = None
+        self.status = SEARCHING
+        self.stopped = multiprocessing.Event()
+        worker = multiprocessing.Process(target=_search, daemon=True,
+                                         args=(State.fromModel(model), self.generation, self.stopped,
+                                               self.messages, self.seconds, self.cache))
+        worker.start()
+        self.workers = [w for w in self.workers if w.is_alive()] + [worker]
+
+    def cancel(self):
+        if self.stopped is not None:
+            self.stopped.set()
+            self.stopped = None
+        self.status = None
+
+    def close(self):
+        '''
+        Stop the search in progress and wait for the workers to finish,
+        so what they were writing to the cache is written.
+        '''
+        self.cancel()
+        deadline = time.monotonic() + CLOSE_SECONDS
+        for worker in self.workers:
+            while worker.is_alive() and time.monotonic() < deadline:
+                self.poll()         # a worker cannot exit with messages still unsent
+                worker.join(0.05)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self.workers = []
+
+    def poll(self):
+        '''
+        Take in what the worker has sent.  Return True if anything
+        changed for the current generation.
+        '''
+        changed = False
+        while True:
+            try:
+                generation, move, status = self.messages.get_nowait()
+            except queue.Empty:
+                return changed
+            if generation != self.generation or self.status is None:
+                continue
+            if move is not None:
+                self.move = move
+            self.status = status
+            changed = True
+
+    def running(self):
+        return self.status == SEARCHING
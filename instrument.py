@@ -0,0 +1,165 @@
+# instrument.py Event latency instrumentation for the Tk interface
+'''
+Measure how long the view's event handlers take, how many Tk canvas
+calls each of them makes, and how many mouse motion events arrive
+compared with how many frames actually move the dragged cards.
+
+Instrumentation is switched on by setting the environment variable
+NAPOLEON_PROFILE, or with  napoleon.pyw --profile .  The value (or the
+option's argument) names the file the results are written to as JSON
+when the program exits; with no file name they go to stderr.
+
+The handlers and canvas methods are wrapped at class level, so install()
+must be called before the View is created, because Tk keeps the bound
+methods it is given.  Each wrapper costs two clock readings and a few
+additions, which is small enough to leave on.
+
+Latencies are kept in histograms with power-of-two buckets: bucket k
+counts the calls that took from 2**(k-1) to 2**k microseconds.
+'''
+import atexit, json, os, sys, time, functools
+import tkinter as tk
+
+ENVIRONMENT = 'NAPOLEON_PROFILE'
+HANDLERS = ('onClick', 'drag', 'flushDrag', 'onDrop', 'show', 'newDeal')
+CANVAS_METHODS = ('coords', 'itemconfigure', 'tag_raise', 'tag_lower', 'move', 'bbox',
+                  'addtag_withtag', 'dtag', 'gettags', 'configure', 'find_withtag')
+BUCKETS = 32
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.most = 0
+
+    def add(self, value):
+        value = int(value)
+        self.buckets[min(value.bit_length(), BUCKETS-1)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.most:
+            self.most = value
+
+    def percentile(self, p):
+        '''
+        Upper bound of the bucket holding the p-th percentile.
+        '''
+        if not self.count:
+            return 0
+        wanted = p * self.count / 100
+        seen = 0
+        for k, n in enumerate(self.buckets):
+            seen += n
+            if seen >= wanted:
+                return 2**k
+        return self.most
+
+    def summary(self):
+        return {'count' : self.count,
+                'mean' : self.total / self.count if self.count else 0,
+                'p50' : self.percentile(50),
+                'p90' : self.percentile(90),
+                'p99' : self.percentile(99),
+                'max' : self.most,
+                'buckets' : {2**k : n for k, n in enumerate(self.buckets) if n}}
+
+class Instrument:
+    '''
+    Collects the measurements.  There is one of these per process.
+    '''
+    def __init__(self):
+        self.latency = {name : Histogram() for name in HANDLERS}    # microseconds
+        self.calls = {name : Histogram() for name in HANDLERS}      # canvas calls per event
+        self.canvasCalls = 0
+        self.motionArrived = 0
+        self.motionHandled = 0
+
+    def timed(self, name, method):
+        latency, calls = self.latency[name], self.calls[name]
+        clock = time.perf_counter
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            before = self.canvasCalls
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                latency.add(1e6 * (clock() - start))
+                calls.add(self.canvasCalls - before)
+        return wrapper
+
+    def counted(self, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            self.canvasCalls += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    def motion(self, method):
+        '''
+        Wrap View.drag: every call is a motion event arriving.
+        '''
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            self.motionArrived += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    def frame(self, method):
+        '''
+        Wrap View.flushDrag: every call that moves the cards handles all
+        the motion events since the last one.
+        '''
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            before = self.canvasCalls
+            try:
+                return method(*args, **kwargs)
+            finally:
+                if self.canvasCalls != before:
+                    self.motionHandled += 1
+        return wrapper
+
+    def summary(self):
+        return {'latency_us' : {name : h.summary() for name, h in self.latency.items() if h.count},
+                'canvas_calls' : {name : h.summary() for name, h in self.calls.items() if h.count},
+                'motion' : {'arrived' : self.motionArrived, 'handled' : self.motionHandled}}
+
+    def dump(self, path=None):
+        text = json.dumps(self.summary(), indent=2)
+        if path:
+            with open(path, 'w') as outfile:
+                outfile.write(text)
+        else:
+            print(text, file=sys.stderr)
+
+def install(viewClass, path=None):
+    '''
+    Wrap the handlers of viewClass and the methods of tk.Canvas, and
+    arrange for the results to be written to path (or stderr) at exit.
+    Return the Instrument.
+    '''
+    instrument = Instrument()
+    for name in HANDLERS:
+        method = getattr(viewClass, name)
+        if name == 'drag':
+            method = instrument.motion(method)
+        elif name == 'flushDrag':
+            method = instrument.frame(method)
+        setattr(viewClass, name, instrument.timed(name, method))
+    for name in CANVAS_METHODS:
+        setattr(tk.Canvas, name, instrument.counted(getattr(tk.Canvas, name)))
+    atexit.register(instrument.dump, path)
+    return instrument
+
+def fromEnvironment(viewClass, path=None):
+    '''
+    Install instrumentation if it was asked for, with path taking
+    precedence over the environment.  Return the Instrument, or None.
+    '''
+    if path is None:
+        path = os.environ.get(ENVIRONMENT)
+        if path is None:
+            return None
+    return install(viewClass, path or None)
@@ -0,0 +1,93 @@
+# loadtest.py Load test for the Napoleon at St. Helena game server
+'''
+Play games on a running server.py from many connections at once and
+report the games finished a second and the latency of move requests,
+timed from sending the request to reading its reply.
+
+Each client deals the next deal number, asks for the legal moves,
+plays one (a move to a foundation if there is one, else one at random),
+and so on until the game is over or MAXMOVES moves have been made, then
+closes the game and deals the next.
+
+    python server.py --port 8765 &
+    python loadtest.py --port 8765 --clients 32 --games 1000
+'''
+import asyncio, itertools, json, random, time
+from model import FOUNDATIONS
+from server import PORT
+
+MAXMOVES = 300       # abandon a game after this many moves
+
+class Client:
+    '''
+    One connection to the server.
+    '''
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.ids = itertools.count()
+
+    async def request(self, **request):
+        request['id'] = next(self.ids)
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        reply = json.loads(await self.reader.readline())
+        if reply['id'] != request['id']:
+            raise RuntimeError('reply %r out of order'%reply['id'])
+        return reply
+
+async def player(host, port, deals, rng, latencies):
+    '''
+    Play the deals taken from the iterator deals until it runs out.
+    Return the number of games played.
+    '''
+    reader, writer = await asyncio.open_connection(host, port)
+    client = Client(reader, writer)
+    games = 0
+    try:
+        for deal in deals:
+            reply = await client.request(op='new', deal=deal)
+            game, state = reply['game'], reply['state']
+            for k in range(MAXMOVES):
+                if state['over']:
+                    break
+                moves = (await client.request(op='moves', game=game))['moves']
+                home = [move for move in moves if move[2] in FOUNDATIONS]
+                move = home[0] if home else rng.choice(moves)
+                start = time.perf_counter()
+                reply = await client.request(op='move', game=game, move=move)
+                latencies.append(time.perf_counter() - start)
+                state = reply['state']
+            await client.request(op='close', game=game)
+            games += 1
+    finally:
+        writer.close()
+    return games
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values)-1, int(p / 100 * len(values)))] if values else 0.0
+
+async def run(host, port, clients, games, seed):
+    deals = iter(range(games))           # shared, so each deal is played once
+    latencies = []
+    start = time.perf_counter()
+    played = await asyncio.gather(*(player(host, port, deals, random.Random(seed+k), latencies)
+                                     for k in range(clients)))
+    return sum(played), time.perf_counter() - start, latencies
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Load test a Napoleon at St. Helena game server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--clients', type=int, default=16, help='connections at once')
+    parser.add_argument('--games', type=int, default=200, help='games to play in all')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    games, seconds, latencies = asyncio.run(run(args.host, args.port, args.clients, args.games, args.seed))
+    print('%d games in %.1f s: %.1f games/s, %d moves, %.0f moves/s'%(
+        games, seconds, games/seconds, len(latencies), len(latencies)/seconds))
+    print('move latency: p50 %.2f ms, p99 %.2f ms, max %.2f ms'%(
+        1000*percentile(latencies, 50), 1000*percentile(latencies, 99), 1000*max(latencies, default=0)))
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 # model.py Model for Napoleon at St. Helena (Forty Thieves) solitaire
 
-import random, itertools
+import os
 
 ACE = 1
 JACK = 11
@@ -16,8 +16,62 @@ SUITNAMES = ('club', 'diamond', 'heart', 'spade')
 RANKNAMES = ["", "Ace"] + list(map(str, range(2, 11))) + ["Jack", "Queen", "King"]
 COLORNAMES = ("red", "blue")     # back colors
 
+# Every pile in the model has a number.  Moves are written as
+# (source, count, destination) triples of pile numbers.  Turning the
+# waste pile over for the second pass is written as NEXTPASS.
+
+TABLEAU = range(10)
+FOUNDATIONS = range(10, 18)
 STOCK = 18
 WASTE = 19
+NEXTPASS = (WASTE, 0, STOCK)
+
+# Every deal has a number, from 0 to DEALS-1, and the same number always 
+# gives the same deal, on any machine and any version of Python, because
+# the shuffle uses its own generator rather than the random module.
+
+DEALS = 2**32
+MASK64 = 2**64 - 1
+
+class DealRandom:
+    '''
+    The splitmix64 generator, seeded with a deal number.
+    '''
+    def __init__(self, seed):
+        self.state = seed & MASK64
+
+    def next(self):
+        '''
+        Return the next 64-bit number.
+        '''
+        self.state = z = (self.state + 0x9E3779B97F4A7C15) & MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+        return z ^ (z >> 31)
+
+    def below(self, n):
+        '''
+        Return a number from 0 to n-1, all equally likely.
+        '''
+        limit = (MASK64 + 1) - (MASK64 + 1) % n
+        while True:
+            x = self.next()
+            if x < limit:
+                return x % n
+
+    def shuffle(self, seq):
+        '''
+        Fisher-Yates shuffle of seq in place.
+        '''
+        for i in range(len(seq)-1, 0, -1):
+            j = self.below(i+1)
+            seq[i], seq[j] = seq[j], seq[i]
+
+def randomDeal():
+    '''
+    Return the number of a deal chosen at random.
+    '''
+    return int.from_bytes(os.urandom(8), 'little') % DEALS
 
 class Stack(list):
     '''
@@ -34,12 +88,15 @@ class Stack(list):
         # Bottom card is self[0]; top is self[-1]
         super().__init__()
 
-    def add(self, card, faceUp):
+    def add(self, card):
         self.append(card)
-        if faceUp:
-            self[-1].showFace()
-        else:
-            self[-1].showBack()
+
+    def faceUp(self, idx):
+        '''
+        Is the card at index idx face up?  Cards are face up everywhere
+        but in the stock.
+        '''
+        return True
 
     def isEmpty(self):
         return not self
@@ -53,16 +110,6 @@ class Stack(list):
         '''
         self.extend(cards)
         self.moving = None
-        
-    def find(self, code):
-        '''
-        If the card with the given code is in the stack,
-        return its index.  If not, return -1.
-        '''
-        for idx, card in enumerate(self):
-            if card.code == code:
-                return idx
-        return -1
 
 class TableauPile(Stack):
     '''
@@ -74,8 +121,6 @@ class TableauPile(Stack):
     def __init__(self):
         super().__init__()
 
-    def add(self, card):
-        Stack.add(self, card, True)
 
     def canSelect(self, idx):
         if idx >= len(self):
@@ -83,18 +128,31 @@ class TableauPile(Stack):
         if not Card.isDescending(self[idx:]):
             return False 
         return True
+
+    def runLength(self):
+        '''
+        Number of cards in the descending sequence at the top of the pile
+        '''
+        n = 1
+        while n < len(self) and self[-n-1] > self[-n]:
+            n += 1
+        return min(n, len(self))
     
+    def accepts(self, cards, limit):
+        '''
+        Can the cards legally be dropped on the pile?
+        '''
+        if self.isEmpty():
+            return len(cards) <= limit//2
+        return len(cards) <= limit and self[-1] > cards[0]
+
     def drop(self, cards, limit):
         '''
         If legal, drop the cards on the pile.
         Return True if legal, else False
         '''
-        if self.isEmpty():
-            if len(cards) > limit//2:
-                return False
-        else:
-            if len(cards) > limit or not (self[-1] > cards[0]):
-                return False
+        if not self.accepts(cards, limit):
+            return False
         self.extend(cards)
         return True
         
@@ -106,23 +164,25 @@ class FoundationPile(Stack):
     def __init__(self):
         super().__init__()
         
-    def add(self, card):
-        Stack.add(self, card, True)   
 
     def canSelect(self, idx):
         return False
     
-    def drop(self, cards, _):
+    def accepts(self, cards, _):
+        '''
+        Can the cards legally be dropped on the pile?
+        '''
+        if self.isEmpty():
+            return cards[-1].rank == ACE
+        return self[-1] < cards[-1]
+
+    def drop(self, cards, limit):
         '''
         If legal, drop the cards on the pile.
         Return True if legal, else False
         '''
-        if self.isEmpty():
-            if cards[-1].rank != ACE:
-                return False
-        else:
-            if not (self[-1] < cards[-1]):
-                return False
+        if not self.accepts(cards, limit):
+            return False
         self.extend(reversed(cards))
         return True    
         
@@ -131,56 +191,76 @@ class WastePile(Stack):
         super().__init__()
         self.parent = parent # the model
         
-    def add(self, card):
-        Stack.add(self, card, True)      
         
     def canSelect(self, idx):
         return not self.isEmpty() and idx == len(self)-1   
     
-    def drop(self, cards, _):
+    def accepts(self, cards, _):
+        '''
+        Only the top card of the stock can be dropped on the waste pile.
+        '''
         model = self.parent
-        if model.moveOrigin != model.stock:
+        return model.moveOrigin is model.stock
+
+    def drop(self, cards, limit):
+        if not self.accepts(cards, limit):
             return False
         self.extend(cards)
         return True
             
 class StockPile(Stack):
+    '''
+    All cards are face down, except perhaps the top card.  Cards added
+    go on face down.
+    '''
     def __init__(self):
         super().__init__()
+        self.topUp = False      # is the top card face up?
         
     def add(self, card):
-        Stack.add(self, card, False)      
+        self.append(card)
+        self.topUp = False
+
+    def clear(self):
+        Stack.clear(self)
+        self.topUp = False
+
+    def faceUp(self, idx):
+        return self.topUp and idx in (-1, len(self)-1)
         
     def canSelect(self, idx):
         return not self.isEmpty() and idx == len(self)-1   
     
+    def accepts(self, _a, _b):
+        return False
+
     def drop(self, _a, _b):
         return False
     
 class Card:
     '''
     A card is identified by its rank, suit, and back color.
-    A card knows whether it is face up or own, but does not know 
-    which stack it is in.
+    A card does not know which stack it is in, nor whether it is 
+    face up; that is up to the stack.  Cards never change, so there
+    is just one of each, in CARDS, shared by every model.
     '''
-    def __init__(self, rank, suit, back):
-        self.rank = rank
-        self.suit = suit
-        self.back = back
-        self.up = False   # all cards are initially face down
-        self.code = 52*COLORNAMES.index(back)+13*SUITNAMES.index(suit)+rank-1  
+    __slots__ = ('rank', 'suit', 'back', 'code')
 
-    def showFace(self):
-        self.up = True
+    def __init__(self, rank, suit, back):
+        setattr = object.__setattr__
+        setattr(self, 'rank', rank)
+        setattr(self, 'suit', suit)
+        setattr(self, 'back', back)
+        setattr(self, 'code', 52*COLORNAMES.index(back)+13*SUITNAMES.index(suit)+rank-1)
 
-    def showBack(self):
-        self.up = False
+    def __setattr__(self, name, value):
+        raise AttributeError('cards cannot be changed')
 
-    def faceUp(self):
-        return self.up
+    __delattr__ = __setattr__
 
-    def faceDown(self):
-        return not self.faceUp()
+    def __reduce__(self):
+        # unpickled and copied cards are the ones in CARDS
+        return (_card, (self.code,))
 
     # Overloaded operators for predecessor and successor
 
@@ -197,7 +277,7 @@ class Card:
         return '%s %s %s'%(self.suit, RANKNAMES[self.rank], self.back)
 
     def __str__(self):
-        return __repr__(self)
+        return repr(self)
 
     @staticmethod
     def isDescending(seq):
@@ -206,9 +286,16 @@ class Card:
         '''
         return all(map(lambda x, y: x > y, seq, seq[1:]))  
 
+# The 104 cards, indexed by code
+CARDS = tuple(Card(code%13+1, SUITNAMES[code//13%4], COLORNAMES[code//52]) for code in range(104))
+
+def _card(code):
+    return CARDS[code]
+
 class Model:
     '''
-    The cards are all in self.deck, and are copied into the appropriate stacks:
+    The cards are all in self.deck, in the order they were dealt, and are
+    copied into the appropriate stacks:
         the stock
         the waste pile
         10 tableau piles, where all the action is
@@ -216,12 +303,10 @@ class Model:
     The top card of the stock is face-up and available for play.  
 
       '''
-    def __init__(self, games, wins, first):
+    def __init__(self, games, wins, first, number=None):
         self.games, self.wins, self.first = games, wins, first
-        random.seed()
-        self.deck = []
+        self.deck = list(CARDS)
         self.selection = []
-        self.createCards()
         self.stock = StockPile()
         self.waste = WastePile(self)
         self.foundations = []
@@ -233,7 +318,27 @@ class Model:
         self.grabPiles = [self.waste, self.stock]  # piles from which cards can be moved 
         self.grabPiles.extend(self.tableau)
         self.dropPiles = [self.waste] + self.tableau + self.foundations # drop on these piles
-        self.deal()
+        self.piles = self.tableau + self.foundations + [self.stock, self.waste]  # by pile number
+        self.numbers = {id(pile) : n for n, pile in enumerate(self.piles)}
+        self.changed = set()    # numbers of piles changed since the view last looked
+        self.locations = {}     # code -> (pile number, index in pile)
+        self.undoStack = []     # journal of moves made, see completeMove and group
+        self.redoStack = []     # moves undone, most recent last
+        self.generator = MoveGenerator(self)
+        self.recorder = None    # a records.GameWriter, if games are being recorded
+        self.deal(number)
+
+    def __setstate__(self, state):
+        # a copy has piles of its own, so numbers must be keyed by them
+        self.__dict__.update(state)
+        self.numbers = {id(pile) : n for n, pile in enumerate(self.piles)}
+
+    @classmethod
+    def fromDeal(cls, number):
+        '''
+        Return a model with deal number  number  laid out.
+        '''
+        return cls(0, 0, 0, number)
 
     def shuffle(self):
         self.stock.clear()
@@ -242,19 +347,19 @@ class Model:
             f.clear()
         for w in self.tableau:
             w.clear()
-        random.shuffle(self.deck)
-        for card in self.deck:
-            card.showBack()
+        # start from the same order every time, so a number always gives the same deal
+        self.deck[:] = CARDS
+        DealRandom(self.number).shuffle(self.deck)
         self.stock.extend(self.deck)
 
-    def createCards(self):
-        for rank, suit, back in itertools.product(ALLRANKS, SUITNAMES, COLORNAMES):
-            self.deck.append(Card(rank, suit, back))
-            
-    def deal(self):
+    def deal(self, number=None):
         '''
-        Deal the cards into the initial layout
+        Deal the cards into the initial layout of deal  number, or of a 
+        deal chosen at random if number is None.
         '''
+        if self.recorder is not None:
+            self.recorder.finish(self.win(), self.passNumber)
+        self.number = randomDeal() if number is None else number % DEALS
         self.passNumber=  1     # two passes allowed
         self.shuffle()
         for n in range(40):
@@ -262,6 +367,13 @@ class Model:
             self.tableau[n%10].add(card)
         self.flipTop()   # turn top card of stock face up
         self.games += 1
+        self.undoStack.clear()
+        self.redoStack.clear()
+        self.generator.reset()
+        self.changed.update(range(len(self.piles)))
+        self.relocate(range(len(self.piles)))
+        if self.recorder is not None:
+            self.recorder.start(self.number)
 
     def grab(self, pile, idx):
         '''
@@ -277,6 +389,8 @@ class Model:
         return self.selection
 
     def abortMove(self):
+        if self.selection:
+            self.changed.add(self.numbers[id(self.moveOrigin)])
         self.selection = []
 
     def moving(self):
@@ -298,11 +412,24 @@ class Model:
             return False 
         if isinstance(pile, StockPile):
             return False
-        if pile in self.tableau:
-            limit = 2 ** len([t for t in self.tableau if not t])
-        else:
-            limit = 13
-        return pile.drop(self.selection, limit)
+        return pile.drop(self.selection, self.limit(pile))
+
+    def accepts(self, pile):
+        '''
+        Can the moving cards be dropped on pile?  Like canDrop, but the 
+        cards are not dropped.
+        '''
+        if not self.selection:
+            return False
+        return pile.accepts(self.selection, self.limit(pile))
+
+    def limit(self, pile):
+        '''
+        The most cards that can be moved onto pile at once.  See canDrop.
+        '''
+        if isinstance(pile, TableauPile):
+            return 2 ** len([t for t in self.tableau if not t])
+        return 13
 
     def completeMove(self, dest):
         '''
@@ -312,26 +439,46 @@ class Model:
         called in self.canDrop)
         Turn the top card of the stock face up, if need be.
         Check for win
+        Record the move in the journal as 
+            (source, count, destination, stock card flipped, game won)
         '''
         source = self.moveOrigin
         source[:] = source[:self.moveIndex]
-        self.flipTop()
+        if source is self.stock:
+            source.topUp = False
+        flipped = self.flipTop()
+        count = len(self.selection)
         self.selection = []
-        if self.win():
+        move = (self.numbers[id(source)], count, self.numbers[id(dest)])
+        self.moved(move, len(dest) - count)
+        won = self.win()
+        if won:
             self.wins += 1
             if self.passNumber == 1:
                 self.first += 1
+        self.record(move + (flipped, won))
+
+    def moved(self, move, start):
+        '''
+        Bring the bookkeeping up to date after cards have been moved.
+        The moved cards are at index start and up in their new pile.
+        '''
+        source, _, dest = move
+        changed = (source, dest, STOCK)
+        self.generator.update(changed)
+        self.changed.update(changed)
+        self.relocate((dest,), start)
         
     def flipTop(self):
         '''
         Turn the top card of stock face up
+        Return True if a card was turned over.
         '''
         w = self.stock
-        try:
-            if w[-1].faceDown():
-                w[-1].showFace()
-        except IndexError:
-            pass
+        if w and not w.topUp:
+            w.topUp = True
+            return True
+        return False
         
     def nextPass(self):
         stock, waste = self.stock, self.waste
@@ -339,34 +486,319 @@ class Model:
         for card in reversed(waste):
             self.stock.add(card)
         waste.clear()
-        self.flipTop()
+        flipped = self.flipTop()
         self.passNumber += 1
+        self.moved(NEXTPASS, 0)
+        self.record(NEXTPASS + (flipped, False))
+
+    def safeMove(self):
+        '''
+        Return a move of a card to a foundation that can never be wanted
+        anywhere else, or None if there is none.  Cards are only built on
+        cards of the same suit one rank higher, so once both cards of the 
+        same suit one rank lower are on the foundations, nothing can be
+        played on the card.  Aces are always safe.
+        '''
+        foundations = self.foundations
+        for source in (WASTE, STOCK) + tuple(TABLEAU):
+            pile = self.piles[source]
+            if not pile or not pile.faceUp(-1):
+                continue
+            card = pile[-1]
+            if card.rank != ACE:
+                home = sum(1 for f in foundations 
+                           if f and f[-1].suit == card.suit and f[-1].rank >= card.rank-1)
+                if home < 2:
+                    continue
+            for dest in FOUNDATIONS:
+                if self.piles[dest].accepts([card], 1):
+                    return (source, 1, dest)
+        return None
+
+    def autoplay(self):
+        '''
+        Play every card that can safely go to a foundation, as one 
+        transaction: the moves are grouped with the last move in the 
+        journal, so that undo takes them back together with the move 
+        that led to them.  Return the codes of the cards played, in order.
+        '''
+        mark = max(len(self.undoStack) - 1, 0)
+        played = []
+        move = self.safeMove()
+        while move is not None:
+            source, _, dest = move
+            played.append(self.piles[source][-1].code)
+            self.play(move)
+            move = self.safeMove()
+        if played:
+            self.group(mark)
+        return played
+
+    def group(self, mark):
+        '''
+        Join the journal entries from index mark up into one entry, a 
+        list of the entries, which is undone and redone as a whole.
+        '''
+        undo = self.undoStack
+        if len(undo) - mark > 1:
+            entries = []
+            for entry in undo[mark:]:
+                entries.extend(entry if isinstance(entry, list) else [entry])
+            undo[mark:] = [entries]
+
+    def history(self):
+        '''
+        Generate the moves in the journal, oldest first, with groups 
+        taken apart.
+        '''
+        for entry in self.undoStack:
+            for move in (entry if isinstance(entry, list) else [entry]):
+                yield move[:3]
+
+    def record(self, entry):
+        '''
+        Add an entry to the journal.  A new move makes the moves undone
+        before it impossible to redo.
+        '''
+        self.undoStack.append(entry)
+        self.redoStack.clear()
+        if self.recorder is not None:
+            self.recorder.add(entry[:3])
+
+    def canUndo(self):
+        return bool(self.undoStack) and not self.moving()
+
+    def canRedo(self):
+        return bool(self.redoStack) and not self.moving()
+
+    def undo(self):
+        '''
+        Take back the last move in the journal.  The work done is in 
+        proportion to the number of cards moved.  Return True if a move
+        was undone.
+        '''
+        if not self.canUndo():
+            return False
+        entry = self.undoStack.pop()
+        if isinstance(entry, list):
+            for part in reversed(entry):
+                self.takeBack(part)
+        else:
+            self.takeBack(entry)
+        self.redoStack.append(entry)
+        return True
+
+    def takeBack(self, entry):
+        '''
+        Reverse one move recorded in the journal.
+        '''
+        if self.recorder is not None:
+            self.recorder.pop()
+        source, count, dest, flipped, won = entry
+        piles = self.piles
+        src, dst = piles[source], piles[dest]
+        if flipped:
+            self.stock.topUp = False
+        start = len(src)
+        if entry[:3] == NEXTPASS:
+            for card in reversed(dst):
+                src.add(card)
+            dst.clear()
+            self.passNumber -= 1
+        else:
+            cards = dst[-count:]
+            del dst[-count:]
+            if dest in FOUNDATIONS:
+                cards.reverse()
+            src.extend(cards)
+            if src is self.stock:
+                src.topUp = True        # it was the top card, face up
+        if won:
+            self.wins -= 1
+            if self.passNumber == 1:
+                self.first -= 1
+        self.moved((dest, count, source), start)
+
+    def redo(self):
+        '''
+        Make the last move undone again.  Return True if a move was redone.
+        '''
+        if not self.canRedo():
+            return False
+        redo = self.redoStack
+        entry = redo.pop()
+        self.redoStack = []
+        mark = len(self.undoStack)
+        if isinstance(entry, list):
+            for part in entry:
+                self.play(part[:3])
+            self.group(mark)
+        else:
+            self.play(entry[:3])
+        self.redoStack = redo
+        return True
         
-    def win(self):
-        return all((len(f) == 13 for f in self.foundations))
-                   
-    def gameOver(self):
-        if self.win():
+    def relocate(self, numbers, start=0):
+        '''
+        Record the locations of the cards in the piles with the given
+        numbers, from index start up.
+        '''
+        locations, piles = self.locations, self.piles
+        for n in numbers:
+            pile = piles[n]
+            for idx in range(start, len(pile)):
+                locations[pile[idx].code] = (n, idx)
+
+    def locate(self, code):
+        '''
+        Return (pile number, index) of the card with the given code.
+        '''
+        return self.locations[code]
+
+    def takeChanged(self):
+        '''
+        Return the numbers of the piles that have changed since the last
+        call, so that only they need to be redrawn.
+        '''
+        changed, self.changed = self.changed, set()
+        return changed
+
+    def legalMoves(self):
+        '''
+        Return a list of all legal moves, as (source, count, destination)
+        triples of pile numbers.
+        '''
+        return self.generator.legalMoves()
+
+    def play(self, move):
+        '''
+        Make a move given as a (source, count, destination) triple.
+        Return True if the move was legal, else False.
+        '''
+        if move == NEXTPASS:
+            if not self.stock.isEmpty() or self.passNumber != 1:
+                return False
+            self.nextPass()
             return True
-        if not self.stock.isEmpty():
+        source, count, dest = move
+        pile = self.piles[source]
+        if not 0 < count <= len(pile) or not self.grab(pile, len(pile)-count):
             return False
-        if self.passNumber == 1:
-            return False
-        tableau = self.tableau
-        foundations = self.foundations
-        if any(tab.isEmpty() for tab in tableau):
+        target = self.piles[dest]
+        if not self.canDrop(target):
+            self.abortMove()
             return False
-        for gp in (p for p in self.grabPiles if not p.isEmpty()):
-            top = gp[-1]
-            if any(top < tab[-1] for tab in tableau):
-                return False
-            if top.rank == ACE and any(f.isEmpty for f in foundations):
-                return False
-            if any(top > f[-1] for f in foundations if not f.isEmpty()):
-                return False
+        self.completeMove(target)
         return True
-            
 
+    def win(self):
+        return all((len(f) == 13 for f in self.foundations))
+                   
+    def gameOver(self):
+        return self.win() or not self.generator.hasMoves()
+
+class MoveGenerator:
+    '''
+    Keeps the legal moves of a model up to date as moves are made.
+
+    The legal moves from each source pile to each destination pile are
+    kept separately, so after a move only the pairs involving the piles
+    that changed need to be looked at again.  The exception is a change
+    in the number of empty tableau piles, which changes the supermove
+    limit for every tableau pile, and so recomputes everything.
+
+    The model tells its generator about every move it makes, so the
+    generator can also be used to drive the model with apply(move).
+    '''
+    SOURCES = tuple(TABLEAU) + (STOCK, WASTE)
+    DESTS = tuple(TABLEAU) + tuple(FOUNDATIONS) + (WASTE,)
 
-  
+    def __init__(self, model):
+        self.model = model
+        self.counts = {}        # (source, dest) -> counts of cards that can move
+        self.total = 0
+        self.empty = None
+
+    def reset(self):
+        '''
+        Recompute all the moves, after the model has been set up afresh.
+        '''
+        self.counts.clear()
+        self.total = 0
+        self.empty = sum(1 for t in self.model.tableau if t.isEmpty())
+        for source in self.SOURCES:
+            self.recountSource(source, self.DESTS)
 
+    def update(self, changed):
+        '''
+        The piles with the numbers in changed have changed.
+        '''
+        if sum(1 for t in self.model.tableau if t.isEmpty()) != self.empty:
+            self.reset()
+            return
+        changed = set(changed)
+        dests = [n for n in changed if n in self.DESTS]
+        for source in self.SOURCES:
+            self.recountSource(source, self.DESTS if source in changed else dests)
+
+    def recountSource(self, source, dests):
+        '''
+        Recompute the moves from source to each of dests.
+        '''
+        counts = self.counts
+        pile = self.model.piles[source]
+        if pile.isEmpty():
+            top, longest = None, 0
+        else:
+            top = pile[-1]
+            longest = pile.runLength() if source in TABLEAU else 1
+        for dest in dests:
+            old = counts.pop((source, dest), ())
+            self.total -= len(old)
+            if top is not None and dest != source:
+                new = self.pairCounts(source, dest, pile, top, longest)
+                if new:
+                    counts[source, dest] = new
+                    self.total += len(new)
+
+    def pairCounts(self, source, dest, pile, top, longest):
+        '''
+        The numbers of cards that can legally move from source to dest,
+        following the rules of the drop methods of the piles.  top is the
+        top card of the source pile, and there are longest cards in 
+        sequence at the top.  The selected cards always end with top, so
+        a foundation takes either all of the counts or none of them, and
+        a tableau pile that is not empty can take at most one count.
+        '''
+        if dest == WASTE:
+            return (1,) if source == STOCK else ()
+        target = self.model.piles[dest]
+        if dest in FOUNDATIONS:
+            fits = top.rank == ACE if target.isEmpty() else target[-1] < top
+            return tuple(range(1, longest+1)) if fits else ()
+        limit = 2 ** self.empty
+        if target.isEmpty():
+            return tuple(range(1, min(longest, limit//2)+1))
+        count = target[-1].rank - top.rank
+        if 0 < count <= min(longest, limit) and target[-1] > pile[-count]:
+            return (count,)
+        return ()
+
+    def nextPassAllowed(self):
+        model = self.model
+        return model.stock.isEmpty() and model.passNumber == 1
+
+    def legalMoves(self):
+        moves = [(source, count, dest) for (source, dest), counts in self.counts.items() for count in counts]
+        if self.nextPassAllowed():
+            moves.append(NEXTPASS)
+        return moves
+
+    def hasMoves(self):
+        return self.total > 0 or self.nextPassAllowed()
+
+    def apply(self, move):
+        '''
+        Make the move in the model.  Return True if it was legal.
+        '''
+        return self.model.play(move)
@@ -2,8 +2,13 @@
 
 from model import Model
 from view import View
+from stats import Stats, WON, LOST, ABANDONED
+import solvable
+from records import GameWriter
+import instrument
 import tkinter as tk
-import os, sys
+import tkinter.messagebox as tkmb
+import os, sys, time, argparse
 
 helpText = '''
 OBJECTIVE
@@ -46,24 +51,57 @@ Four more moves get the 5, 6 and 7 on top of the 8. This app allows you to move
 all four cards at once, if there are sufficient empty piles.  If there were only two \
 empty tableau piles, the app would allow you to move all four cards onto the \
 9 of Diamonds at the top of another tableau pile.
+
+UNDO
+
+Ctrl-Z takes back the last move, even turning the stock over for the second \
+pass, and Ctrl-Y makes it again.  Both are also on the Edit menu.
+
+AUTOPLAY
+
+After each move, any card that can never be needed in the tableau goes to the \
+foundations by itself: an Ace at once, any other card as soon as both cards of \
+its suit one rank lower are up.  Undo takes these back along with the move that \
+led to them.  Autoplay, and whether the cards are seen going home one at a time, \
+can be turned off on the Edit menu.
+
+DEAL NUMBERS
+
+Every deal has a number, shown in the status bar.  Play Deal #N on the Game \
+menu deals any number again, the same way on every computer, so a game can be \
+shared or replayed.  If a deal index has been made with solvable.py, the Game \
+menu can also deal a random deal known to be winnable, or a hard one.
+
+HINTS
+
+Press H, or choose Hint from the Edit menu, and the cards to move and the pile \
+to move them to are outlined.  The hint comes from a search that goes on in \
+the background, so it may change to a better move if you wait a moment.
 '''
 
 CARD_DIR = os.path.join(os.path.dirname(sys.argv[0]), 'decks')
 DEFAULT_DECK = os.path.join(CARD_DIR, 'jumbo2VERTGIF')
+STATS_FILE = 'napoleon.db'
+CACHE_FILE = 'solutions.db'    # solver results, for hints
+INDEX_FILE = 'deals.idx'       # made by solvable.py
+RECORD_FILE = 'games.rec'      # every game played, see records.py
+FLUSH_MS = 5000          # finished games are written to the statistics this often
+
 class Napoleon:
     def __init__(self):
-        try:
-            dirname = os.path.dirname(sys.argv[0])
-            with open(os.path.join(dirname, 'napoleon.ini')) as infile:
-                text = infile.readlines()
-                games = int(text[0].strip())
-                wins = int(text[1].strip())
-                first = int(text[2].strip())
-                deck = os.path.join(dirname,text[3].strip())
-        except IOError:
-            games,wins,first,deck = 0,0,0,DEFAULT_DECK
+        dirname = os.path.dirname(sys.argv[0])
+        self.stats = Stats(os.path.join(dirname, STATS_FILE))
+        self.stats.migrate(os.path.join(dirname, 'napoleon.ini'))
+        games, wins, first = self.stats.totals()
+        deck = self.stats.setting('deck', DEFAULT_DECK)
+        self.flushJob = None
+        self.started = time.time()
         self.model = Model(games, wins, first)
         self.view = View(self, self.quit, deck, width=950, height=1000)
+        self.view.hints.cache = os.path.join(dirname, CACHE_FILE)
+        self.dealIndex = None          # opened when first wanted
+        self.archive = GameWriter(open(os.path.join(dirname, RECORD_FILE), 'ab'))
+        self.archive.attach(self.model)
         self.makeHelp()
         self.makeMenu()
         self.view.start()      #  start the event loop
@@ -94,12 +132,80 @@ class Napoleon:
         self.helpText.deiconify()
         self.helpText.text.see('1.0')  
         
-    def saveStats(self):
+    def recordGame(self):
+        '''
+        Add the game in play to the statistics, as the player leaves it.
+        The statistics are written a few seconds later, with any other
+        games finished in the meantime.  A game with no moves is not
+        counted, so leaving a fresh deal does not end a winning streak.
+        '''
         model = self.model
-        games, wins, first = model.games, model.wins, model.first
-        with open('napoleon.ini', 'w') as outfile:
-            outfile.write('%d\n%d\n%d\n'%(games, wins, first))
-            outfile.write('%s\n'%self.view.deck.get())
+        moves = sum(1 for move in model.history())
+        now = time.time()
+        if not moves:
+            self.started = now
+            return
+        if model.win():
+            result = WON
+        elif not model.generator.hasMoves():
+            result = LOST
+        else:
+            result = ABANDONED
+        self.stats.add(model.number, result, model.passNumber, moves, now - self.started,
+                       os.path.basename(self.view.deck.get()))
+        self.started = now
+        if self.flushJob is None:
+            self.flushJob = self.view.root.after(FLUSH_MS, self.flushStats)
+
+    def totals(self):
+        '''
+        Return (games, wins, first pass wins) for the status bar: the
+        games in the statistics, and the game in play once it has a
+        move, as recordGame will count it.
+        '''
+        games, wins, first = self.stats.totals()
+        model = self.model
+        if model.undoStack:
+            games += 1
+            if model.win():
+                wins += 1
+                first += model.passNumber == 1
+        return games, wins, first
+
+    def flushStats(self):
+        self.flushJob = None
+        self.stats.flush()
+
+    def pickDeal(self, wanted, kind):
+        '''
+        Deal a deal chosen at random from those in the deal index that
+        satisfy wanted; see solvable.py.
+        '''
+        if self.dealIndex is None:
+            path = os.path.join(os.path.dirname(sys.argv[0]), INDEX_FILE)
+            try:
+                self.dealIndex = solvable.SolvableIndex(path)
+            except (IOError, ValueError) as e:
+                tkmb.showinfo(title='No Deal Index', 
+                              message='%s\nRun  python solvable.py %s  to make one.'%(e, path))
+                return
+        number = self.dealIndex.pick(wanted)
+        if number is None:
+            tkmb.showinfo(title='No Deal Found', message='The deal index has no %s deals.'%kind)
+            return
+        self.view.newDeal(number=number)
+
+    def showStats(self):
+        tkmb.showinfo(title='Napoleon at St. Helena Statistics', message=self.stats.report(periods=6))
+
+    def saveStats(self):
+        self.recordGame()
+        self.stats.setSetting('deck', self.view.deck.get())
+        self.stats.close()
+        self.view.hints.close()
+        self.archive.close(self.model)
+        if self.dealIndex is not None:
+            self.dealIndex.close()
             
     def makeMenu(self):
         top = self.view.menu
@@ -111,10 +217,31 @@ class Napoleon:
                 value=os.path.join(CARD_DIR,deck),
                 variable=self.view.deck)
         top.add_cascade(label='Deck', menu=options)
+        edit = tk.Menu(top, tearoff=False)
+        edit.add_command(label='Undo', accelerator='Ctrl+Z', command=self.view.undo)
+        edit.add_command(label='Redo', accelerator='Ctrl+Y', command=self.view.redo)
+        edit.add_command(label='Hint', accelerator='H', command=self.view.hint)
+        edit.add_separator()
+        edit.add_checkbutton(label='Autoplay', variable=self.view.autoplay)
+        edit.add_checkbutton(label='Animate Autoplay', variable=self.view.animate)
+        top.add_cascade(label='Edit', menu=edit)
+        game = tk.Menu(top, tearoff=False)
+        game.add_command(label='New Deal', command=self.view.newDeal)
+        game.add_command(label='Play Deal #N...', command=self.view.chooseDeal)
+        game.add_command(label='Random Winnable Deal', 
+                         command=lambda: self.pickDeal(solvable.winnable, 'winnable'))
+        game.add_command(label='Hard Deal', command=lambda: self.pickDeal(solvable.hard, 'hard'))
+        top.add_cascade(label='Game', menu=game)
+        top.add_command(label='Statistics', command=self.showStats)
 
     def quit(self):
         self.saveStats()
         self.view.root.quit()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Napoleon at St. Helena solitaire')
+    parser.add_argument('--profile', nargs='?', const='', default=None, metavar='FILE',
+                        help='measure event handling, and write the results to FILE (default stderr) on exit')
+    args = parser.parse_args()
+    instrument.fromEnvironment(View, args.profile)
     Napoleon()
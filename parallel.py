@@ -0,0 +1,267 @@
+# parallel.py Parallel solver for Napoleon at St. Helena
+'''
+Solve one position on all cores by root splitting: the top of the search
+tree is expanded breadth-first until there are several positions for
+each worker, and these are handed out to a process pool as they are
+needed, so a worker that finishes early simply takes the next one.
+
+The workers share a table of positions proven lost (see solver.py).
+Each worker keeps its own TranspositionTable and copies its new proofs
+into a shared array in batches, under a lock; reads of the shared array
+take no lock.  As soon as any worker finds a win it sets an event, the
+others notice it within a few thousand nodes and give up, and the line
+to the win is the moves to its frontier position followed by its own.
+
+The node budget is shared the same way: the workers add the nodes they
+have searched to a shared count whenever they look at their budget, and
+all of them give up once it has run out, so more workers search the
+same number of nodes between them, only sooner.
+
+    python parallel.py 17 23                   # solve deals number 17 and 23
+    python parallel.py --scaling 1,2,4,8 17    # time them on 1, 2, 4, 8 workers
+'''
+import ctypes, multiprocessing, time
+from solver import Solver, Search, TranspositionTable, Result, legalMoves, WON, LOST, UNKNOWN
+from state import State
+
+SPLIT = 4            # frontier positions per worker
+BATCH = 256          # proofs copied to the shared table at a time
+
+class SharedTable(TranspositionTable):
+    '''
+    A TranspositionTable whose proofs are also published to, and looked
+    up in, a table shared by all the workers.
+    '''
+    def __init__(self, shared, lock, bits):
+        super().__init__(bits)
+        self.shared = shared
+        self.sharedMask = len(shared) - 1
+        self.lock = lock
+        self.pending = []
+
+    def __contains__(self, h):
+        return TranspositionTable.__contains__(self, h) or self.shared[h & self.sharedMask] == (h or 1)
+
+    def add(self, h):
+        TranspositionTable.add(self, h)
+        self.pending.append(h or 1)
+        if len(self.pending) >= BATCH:
+            self.flush()
+
+    def flush(self):
+        shared, mask = self.shared, self.sharedMask
+        with self.lock:
+            for h in self.pending:
+                shared[h & mask] = h
+        self.pending = []
+
+class Totals:
+    '''
+    The stores and evictions of the workers' tables, added up, for a
+    Result in place of a TranspositionTable.
+    '''
+    def __init__(self):
+        self.stores = self.evictions = 0
+
+# State of each worker process
+
+_table = None
+_found = None
+_spent = None
+
+def _initWorker(shared, lock, found, spent, bits):
+    global _table, _found, _spent
+    _table = SharedTable(shared, lock, bits)
+    _found = found
+    _spent = spent
+
+class WorkerSolver(Solver):
+    '''
+    A Solver whose nodes are taken from the budget shared by all the
+    workers, maxNodes between them.
+    '''
+    def __init__(self, maxNodes, maxSeconds):
+        super().__init__(None, maxSeconds, table=_table, stop=_found.is_set)
+        self.budget = maxNodes
+        self.counted = 0        # nodes already added to _spent
+
+    def count(self, nodes):
+        '''
+        Add the nodes searched since the last count to the shared count.
+        Return the nodes spent by all the workers.
+        '''
+        with _spent.get_lock():
+            _spent.value += nodes - self.counted
+            spent = _spent.value
+        self.counted = nodes
+        return spent
+
+    def outOfBudget(self, nodes, start):
+        spent = self.count(nodes)
+        if self.budget is not None and spent >= self.budget:
+            return True
+        return Solver.outOfBudget(self, nodes, start)
+
+def _solve(task):
+    index, data, maxNodes, deadline = task
+    if _found.is_set() or (maxNodes is not None and _spent.value >= maxNodes):
+        return index, UNKNOWN, [], 0, 0, 0, 0
+    maxSeconds = None if deadline is None else max(0.0, deadline - time.time())
+    stores, evictions = _table.stores, _table.evictions
+    solver = WorkerSolver(maxNodes, maxSeconds)
+    result = solver.solve(State(bytearray(data)))
+    solver.count(result.nodes)
+    _table.flush()
+    if result.status == WON:
+        _found.set()
+    return (index, result.status, result.moves, result.nodes, result.hits,
+            _table.stores - stores, _table.evictions - evictions)
+
+def split(state, parts):
+    '''
+    Expand state breadth-first until there are at least parts positions
+    on the frontier.  Return (frontier, win), where frontier is a list of
+    (State, moves from state), and win is a winning line if one turned
+    up on the way, else None.
+    '''
+    frontier = [(state, [])]
+    seen = set()
+    while frontier and len(frontier) < parts:
+        deeper = []
+        for position, line in frontier:
+            search = Search(position.piles(), position.passNumber)
+            moves = legalMoves(search.piles, search.passNumber)
+            if not moves:
+                continue
+            for move in moves:
+                search.make(move)
+                if search.won():
+                    return [], line + [move]
+                if search.hash not in seen:
+                    seen.add(search.hash)
+                    deeper.append((State.fromPiles(search.piles, search.passNumber), line + [move]))
+                search.unmake(move)
+        frontier = deeper
+    return frontier, None
+
+class ParallelSolver:
+    '''
+    A pool of worker processes sharing a table of lost positions.
+    Use it as a context manager, or call close() when finished.
+    '''
+    def __init__(self, processes=None, maxNodes=None, maxSeconds=None, tableBits=20, sharedBits=22,
+                 cache=None):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.maxNodes = maxNodes
+        self.maxSeconds = maxSeconds
+        self.cache = cache          # a cache.SolverCache, used as by Solver
+        self.shared = multiprocessing.Array(ctypes.c_uint64, 1 << sharedBits, lock=False)
+        self.found = multiprocessing.Event()
+        self.spent = multiprocessing.Value(ctypes.c_int64, 0)     # nodes searched by the workers
+        lock = multiprocessing.Lock()
+        self.pool = multiprocessing.Pool(self.processes, _initWorker,
+                                         (self.shared, lock, self.found, self.spent, tableBits))
+
+    def solve(self, position):
+        '''
+        position is a Model or a State.  Return a solver.Result.
+        '''
+        deal = None
+        if not isinstance(position, State):
+            if not position.undoStack:
+                deal = position.number
+            position = State.fromModel(position)
+        if self.cache is not None:
+            result = self.cache.get(position, self.maxNodes, self.maxSeconds)
+            if result is not None:
+                return result
+        result = self.search(position)
+        if self.cache is not None:
+            self.cache.put(position, result, deal, self.maxNodes, self.maxSeconds)
+        return result
+
+    def search(self, position):
+        start = time.perf_counter()
+        self.found.clear()
+        self.spent.value = 0
+        totals = Totals()
+        frontier, win = split(position, SPLIT*self.processes)
+        if win is not None:
+            return Result(WON, win, 0, time.perf_counter() - start, 0, totals)
+        deadline = None if self.maxSeconds is None else time.time() + self.maxSeconds
+        tasks = [(k, bytes(s.data), self.maxNodes, deadline) for k, (s, line) in enumerate(frontier)]
+        status, moves, nodes, hits = LOST, [], 0, 0
+        for index, outcome, line, n, h, stores, evictions in self.pool.imap_unordered(_solve, tasks):
+            nodes += n
+            hits += h
+            totals.stores += stores
+            totals.evictions += evictions
+            if outcome == WON and status != WON:
+                status, moves = WON, frontier[index][1] + line
+                self.found.set()
+            elif outcome == UNKNOWN and status == LOST:
+                status = UNKNOWN
+        return Result(status, moves, nodes, time.perf_counter() - start, hits, totals)
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def scaling(seeds, counts, maxNodes=None, maxSeconds=None):
+    '''
+    Solve the deals with each number of workers in counts, and print the
+    time taken and the speedup over the first count.
+    '''
+    from model import Model
+    model = Model(0, 0, 0)
+    states = []
+    for seed in seeds:
+        model.deal(seed)
+        states.append(State.fromModel(model))
+    base = None
+    print('workers   seconds  speedup     nodes  results')
+    for count in counts:
+        with ParallelSolver(count, maxNodes, maxSeconds) as solver:
+            start = time.perf_counter()
+            results = [solver.solve(state) for state in states]
+            seconds = time.perf_counter() - start
+        base = base or seconds
+        print('%7d %9.2f %8.2f %9d  %s'%(count, seconds, base/seconds, sum(r.nodes for r in results),
+                                          ' '.join(r.status for r in results)))
+
+def main(argv=None):
+    import argparse
+    from model import Model
+    parser = argparse.ArgumentParser(description='Solve Napoleon at St. Helena deals on all cores.')
+    parser.add_argument('seeds', type=int, nargs='+', help='numbers of the deals to solve')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--nodes', type=int, default=None, help='node budget per deal')
+    parser.add_argument('--seconds', type=float, default=None, help='time budget per deal')
+    parser.add_argument('--scaling', default=None, help='comma separated worker counts to compare')
+    parser.add_argument('--cache', default=None, help='database of results kept between runs')
+    args = parser.parse_args(argv)
+    if args.scaling:
+        scaling(args.seeds, [int(n) for n in args.scaling.split(',')], args.nodes, args.seconds)
+        return
+    cache = None
+    if args.cache:
+        from cache import SolverCache
+        cache = SolverCache(args.cache)
+    model = Model(0, 0, 0)
+    try:
+        with ParallelSolver(args.processes, args.nodes, args.seconds, cache=cache) as solver:
+            for seed in args.seeds:
+                model.deal(seed)
+                print('%d: %r'%(seed, solver.solve(model)))
+    finally:
+        if cache is not None:
+            cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# position.py Persistent positions for Napoleon at St. Helena
+'''
+A Position is a position that never changes: playing a move gives a new
+Position and leaves the old one as it was, so a search can keep any
+number of positions along as many lines as it likes, and branch from
+any of them, without copying a Model or making and unmaking moves.
+
+The piles are a tuple of 20 bytes objects of card codes, by pile number,
+as in state.State.  A move copies just the two piles it touches (the
+stock and the waste for model.NEXTPASS) and shares the other 18 with
+the position it was played in, so a new position costs the cards that
+moved, their two piles, and a tuple of 20 references, whatever the
+number of cards elsewhere.  The stock is always face down except for
+its top card, so turning it up (Model.flipTop) changes nothing here.
+
+The Zobrist hash of solver.py is brought up to date as each move is
+played, from the cards that moved, and serves as the hash of the
+position, so positions can be put in sets and dictionaries at no cost.
+Moves are trusted to be legal; moves() gives the legal ones.
+
+    start = Position.fromModel(model)
+    for move in start.moves():
+        child = start.play(move)
+'''
+from state import State, FACE, PILES
+from solver import ZOBRIST, PASSKEY, MAXDEPTH, zobrist, legalMoves
+from model import FOUNDATIONS, STOCK, WASTE, NEXTPASS
+
+class Position:
+    '''
+    piles is a tuple of 20 bytes objects of card codes, by pile number.
+    The hash and the number of cards on the foundations are worked out
+    if not given.
+    '''
+    __slots__ = ('piles', 'passNumber', 'hash', 'home')
+
+    def __init__(self, piles, passNumber, h=None, home=None):
+        self.piles = piles
+        self.passNumber = passNumber
+        self.hash = zobrist(piles, passNumber) if h is None else h
+        self.home = sum(len(piles[n]) for n in FOUNDATIONS) if home is None else home
+
+    @classmethod
+    def fromState(cls, state):
+        return cls(tuple(map(bytes, state.piles())), state.passNumber)
+
+    @classmethod
+    def fromModel(cls, model):
+        return cls(tuple(bytes(card.code for card in pile) for pile in model.piles), model.passNumber)
+
+    def toState(self):
+        return State.fromPiles(self.piles, self.passNumber)
+
+    def toModel(self, model):
+        '''
+        Set up model in this position, for display.  Return the model.
+        '''
+        return self.toState().toModel(model)
+
+    def play(self, move):
+        '''
+        Return the position after move.
+        '''
+        piles = self.piles
+        if move == NEXTPASS:
+            waste = piles[WASTE]
+            h = self.hash ^ PASSKEY
+            n = len(waste)
+            for pos, code in enumerate(waste):
+                face = FACE[code]
+                h ^= ZOBRIST[(face*PILES + WASTE)*MAXDEPTH + pos]
+                h ^= ZOBRIST[(face*PILES + STOCK)*MAXDEPTH + n-1-pos]
+            changed = list(piles)
+            changed[STOCK], changed[WASTE] = waste[::-1], b''
+            return Position(tuple(changed), self.passNumber+1, h, self.home)
+        source, count, dest = move
+        src, dst = piles[source], piles[dest]
+        base = len(src) - count
+        cards = src[base:]
+        home = self.home
+        if dest in FOUNDATIONS:
+            cards = cards[::-1]
+            home += count
+        h = self.hash
+        pos = len(dst)
+        for k, code in enumerate(cards):
+            face = FACE[code]
+            h ^= ZOBRIST[(face*PILES + source)*MAXDEPTH + base + (count-1-k if dest in FOUNDATIONS else k)]
+            h ^= ZOBRIST[(face*PILES + dest)*MAXDEPTH + pos + k]
+        changed = list(piles)
+        changed[source], changed[dest] = src[:base], dst + cards
+        return Position(tuple(changed), self.passNumber, h, home)
+
+    def moves(self):
+        '''
+        The legal moves, best first, as solver.legalMoves gives them.
+        '''
+        return legalMoves(self.piles, self.passNumber)
+
+    def won(self):
+        return self.home == 104
+
+    def __eq__(self, other):
+        return (isinstance(other, Position) and self.hash == other.hash and
+                self.passNumber == other.passNumber and self.piles == other.piles)
+
+    def __hash__(self):
+        return self.hash
+
+    def __repr__(self):
+        return 'Position(%r, %d)'%(self.piles, self.passNumber)
@@ -0,0 +1,219 @@
+# records.py Compact game records for Napoleon at St. Helena
+'''
+A game is recorded as the number of its deal and the moves made, two
+bytes a move, so that millions of games fit in an archive that can be
+read back at the speed of the disk.  An archive is the header MAGIC
+followed by the games, one after another:
+
+    deal        4 bytes, the deal number (see model.Model.deal)
+    flags       1 byte, WON_FLAG if the game was won, plus the passes used
+    count       4 bytes, the number of moves
+    moves       count 16-bit words
+
+A move (source, count, destination) is packed as
+
+    source << 11 | destination << 6 | count << 2
+
+with the source and destination pile numbers in 5 bits each and the
+count (1 to 13) in 4 bits; the bottom two bits are zero.  Turning the
+stock over for the second pass is model.NEXTPASS, which has count 0.
+Everything is little-endian.
+
+A GameWriter is hooked into a Model as its recorder: each move the model
+records in its journal is added to the game in progress, a move taken
+back is dropped, and the game is written out when the next one is
+dealt.  readGames() generates the games in an archive one at a time,
+and the moves of each are only unpacked when asked for, so an archive
+can be scanned without holding more than one game in memory.
+'''
+import struct, sys
+from array import array
+
+MAGIC = b'NAPG\x01'
+GAME = struct.Struct('<IBI')     # deal, flags, count
+WON_FLAG = 0x80
+
+def packMove(move):
+    source, count, dest = move
+    return source << 11 | dest << 6 | count << 2
+
+def unpackMove(word):
+    return (word >> 11, (word >> 2) & 15, (word >> 6) & 31)
+
+def toBytes(words):
+    if sys.byteorder == 'big':
+        words = array('H', words)
+        words.byteswap()
+    return words.tobytes()
+
+def pack(moves):
+    '''
+    Pack a sequence of moves into bytes.
+    '''
+    return toBytes(array('H', map(packMove, moves)))
+
+def unpack(data):
+    '''
+    Generate the moves packed in data.
+    '''
+    words = array('H')
+    words.frombytes(data)
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return map(unpackMove, words)
+
+class GameWriter:
+    '''
+    Writes games to outfile, an archive opened for writing in binary,
+    which is given its header if it is empty.  attach() it to a model to
+    record the games played with the model.
+    '''
+    def __init__(self, outfile):
+        self.outfile = outfile
+        if outfile.tell() == 0:
+            outfile.write(MAGIC)
+        self.deal = None            # number of the game in progress
+        self.moves = array('H')
+        self.games = 0
+
+    def attach(self, model):
+        '''
+        Record the games played with model, starting with the one in
+        progress.
+        '''
+        model.recorder = self
+        self.start(model.number)
+        for move in model.history():
+            self.add(move)
+
+    def start(self, deal):
+        self.deal = deal
+        del self.moves[:]
+
+    def add(self, move):
+        self.moves.append(packMove(move))
+
+    def pop(self):
+        self.moves.pop()
+
+    def finish(self, won, passes):
+        '''
+        Write the game in progress, if there is one.
+        '''
+        if self.deal is None:
+            return
+        self.writeGame(self.deal, won, passes, toBytes(self.moves))
+        self.deal = None
+        del self.moves[:]
+
+    def writeGame(self, deal, won, passes, data):
+        '''
+        Write a whole game, with its moves already packed.
+        '''
+        flags = (WON_FLAG if won else 0) | passes
+        self.outfile.write(GAME.pack(deal, flags, len(data) // 2))
+        self.outfile.write(data)
+        self.games += 1
+
+    def close(self, model=None):
+        '''
+        Write the game in progress in model, if given, and close the
+        archive.
+        '''
+        if model is not None:
+            self.finish(model.win(), model.passNumber)
+        self.outfile.close()
+
+class Game:
+    '''
+    One game read from an archive.  data holds its count moves, packed.
+    '''
+    __slots__ = ('deal', 'won', 'passes', 'count', 'data')
+
+    def __init__(self, deal, flags, count, data):
+        self.deal = deal
+        self.won = bool(flags & WON_FLAG)
+        self.passes = flags & ~WON_FLAG
+        self.count = count
+        self.data = data
+
+    def __len__(self):
+        return self.count
+
+    def moves(self):
+        return unpack(self.data)
+
+    def replay(self, model):
+        '''
+        Deal the game in model and make its moves.  Return the model.
+        '''
+        model.deal(self.deal)
+        for move in self.moves():
+            if not model.play(move):
+                raise ValueError('illegal move %r in deal %d'%(move, self.deal))
+        return model
+
+    def finalState(self, model):
+        '''
+        Return the position at the end of the game as a state.State,
+        making the moves on the compact piles of the solver rather than
+        in model, which is only used to lay out the deal.
+        '''
+        from state import State
+        from solver import Search
+        model.deal(self.deal)
+        start = State.fromModel(model)
+        search = Search(start.piles(), start.passNumber)
+        for move in self.moves():
+            search.make(move)
+        return State.fromPiles(search.piles, search.passNumber)
+
+    def __repr__(self):
+        return 'Game(deal %d, %d moves, %s, %d passes)'%(
+            self.deal, len(self), 'won' if self.won else 'not won', self.passes)
+
+def readGames(infile, moves=True):
+    '''
+    Generate the games in an archive opened for reading in binary.  If
+    moves is False the moves are skipped over, not read, and each game's
+    data is empty, which is faster still.
+    '''
+    if infile.read(len(MAGIC)) != MAGIC:
+        raise ValueError('not a game archive')
+    header = GAME.size
+    while True:
+        data = infile.read(header)
+        if len(data) < header:
+            return
+        deal, flags, count = GAME.unpack(data)
+        if moves:
+            yield Game(deal, flags, count, infile.read(2 * count))
+        else:
+            infile.seek(2 * count, 1)
+            yield Game(deal, flags, count, b'')
+
+def summary(path):
+    '''
+    Return (games, moves, wins, first pass wins) in the archive at path,
+    reading only the headers of the games.
+    '''
+    games = moves = wins = first = 0
+    with open(path, 'rb') as infile:
+        for game in readGames(infile, moves=False):
+            games += 1
+            moves += game.count
+            wins += game.won
+            first += game.won and game.passes == 1
+    return games, moves, wins, first
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Summarize archives of Napoleon at St. Helena games.')
+    parser.add_argument('paths', nargs='+', help='archive files')
+    args = parser.parse_args(argv)
+    for path in args.paths:
+        games, moves, wins, first = summary(path)
+        print('%s: %d games, %d moves, %d won, %d on the first pass'%(path, games, moves, wins, first))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# server.py Game server for Napoleon at St. Helena
+'''
+Serve games without the Tk interface, to bots and other front ends,
+over a local TCP socket.  Each connection may hold several games, each
+in a Model of its own, and speaks newline-delimited JSON: one request
+per line, answered by one reply per line, in order.
+
+    {"id": 1, "op": "new", "deal": 17}          deal a game (random if no deal)
+    {"id": 2, "op": "state", "game": 0}         the position
+    {"id": 3, "op": "moves", "game": 0}         the legal moves
+    {"id": 4, "op": "move", "game": 0, "move": [18, 1, 19]}
+    {"id": 5, "op": "undo", "game": 0}
+    {"id": 6, "op": "solve", "game": 0, "nodes": 100000}
+    {"id": 7, "op": "close", "game": 0}
+
+Every reply has the id of its request and "ok"; a failed request has
+"ok": false and an "error".  new, state, move and undo reply with the
+"state" of the game: its deal, pass number, the piles by pile number
+as lists of card codes (see model.Card), and whether it is won or over.
+Moves are [source, count, destination] as in model.py.
+
+Moves are made in the event loop itself, since Model keeps the legal
+moves up to date as it goes and a move takes under a millisecond; only
+the solver, which takes seconds, is sent to a pool of worker processes.
+A connection's requests are handled one at a time, and the next one is
+not read until the reply to the last has been taken by the socket, so
+a client that sends faster than it reads is simply held up, and its
+backlog stays in its own socket buffers, not in the server.
+
+    python server.py --port 8765 --processes 4
+    python loadtest.py --port 8765 --clients 32 --games 1000
+'''
+import asyncio, json, sys
+from concurrent.futures import ProcessPoolExecutor
+from model import Model, DEALS
+from solver import Solver, TranspositionTable
+from state import State
+
+PORT = 8765
+MAXGAMES = 64            # games open at once on one connection
+MAXLINE = 1 << 16        # longest request, in bytes
+SOLVENODES = 200000      # most nodes a solve request may ask for
+
+class RequestError(Exception):
+    pass
+
+# The solver workers.  Each keeps its table of lost positions from one
+# request to the next.
+
+_table = None
+
+def _initWorker():
+    global _table
+    _table = TranspositionTable(22)
+
+def _solve(data, nodes):
+    result = Solver(nodes, table=_table).solve(State(bytearray(data)))
+    return result.status, result.best, result.nodes
+
+def gameState(model):
+    return {'deal' : model.number,
+            'pass' : model.passNumber,
+            'piles' : [[card.code for card in pile] for pile in model.piles],
+            'won' : model.win(),
+            'over' : model.gameOver()}
+
+class Connection:
+    '''
+    The games of one client.
+    '''
+    def __init__(self, server):
+        self.server = server
+        self.games = {}
+        self.nextGame = 0
+
+    def game(self, request):
+        number = request.get('game')
+        # bool is a subclass of int, so true would be game 1
+        if type(number) is not int or number not in self.games:
+            raise RequestError('no such game')
+        return self.games[number]
+
+    async def handle(self, request):
+        op = request.get('op')
+        if op == 'new':
+            if len(self.games) >= MAXGAMES:
+                raise RequestError('too many games')
+            deal = request.get('deal')
+            if deal is not None and (type(deal) is not int or not 0 <= deal < DEALS):
+                raise RequestError('bad deal number')
+            model = Model(0, 0, 0, deal)
+            number = self.nextGame
+            self.nextGame += 1
+            self.games[number] = model
+            return {'game' : number, 'state' : gameState(model)}
+        model = self.game(request)
+        if op == 'state':
+            return {'state' : gameState(model)}
+        if op == 'moves':
+            return {'moves' : sorted(model.legalMoves())}
+        if op == 'move':
+            move = request.get('move')
+            if (not isinstance(move, list) or len(move) != 3 or
+                    not all(type(n) is int and 0 <= n < len(model.piles) for n in move)):
+                raise RequestError('bad move')
+            if not model.play(tuple(move)):
+                raise RequestError('illegal move')
+            return {'state' : gameState(model)}
+        if op == 'undo':
+            if not model.undo():
+                raise RequestError('nothing to undo')
+            return {'state' : gameState(model)}
+        if op == 'solve':
+            nodes = request.get('nodes', SOLVENODES)
+            if type(nodes) is not int or nodes <= 0:
+                raise RequestError('bad node budget')
+            status, moves, nodes = await self.server.solve(model, min(nodes, SOLVENODES))
+            return {'status' : status, 'moves' : moves, 'nodes' : nodes}
+        if op == 'close':
+            del self.games[request['game']]
+            return {}
+        raise RequestError('unknown op %r'%op)
+
+class GameServer:
+    '''
+    Serves games, with a pool of the given number of processes (all
+    cores by default) for the solver.
+    '''
+    def __init__(self, processes=None):
+        self.pool = ProcessPoolExecutor(processes, initializer=_initWorker)
+        self.connections = 0
+        self.requests = 0
+
+    async def solve(self, model, nodes):
+        data = bytes(State.fromModel(model).data)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pool, _solve, data, nodes)
+
+    async def serve(self, reader, writer):
+        connection = Connection(self)
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:          # longer than MAXLINE
+                    writer.write(b'{"id": null, "ok": false, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                writer.write(json.dumps(await self.reply(connection, line)).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def reply(self, connection, line):
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError
+        except ValueError:
+            return {'id' : None, 'ok' : False, 'error' : 'not a JSON object'}
+        try:
+            answer = await connection.handle(request)
+        except RequestError as e:
+            return {'id' : request.get('id'), 'ok' : False, 'error' : str(e)}
+        answer.update(id=request.get('id'), ok=True)
+        return answer
+
+    async def run(self, host, port, ready=None):
+        server = await asyncio.start_server(self.serve, host, port, limit=MAXLINE)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Serve Napoleon at St. Helena games as JSON lines.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--processes', type=int, default=None, help='solver processes (default: all cores)')
+    args = parser.parse_args(argv)
+    server = GameServer(args.processes)
+    def ready(listener):
+        print('serving on %s'%', '.join('%s:%d'%s.getsockname()[:2] for s in listener.sockets),
+              file=sys.stderr)
+    try:
+        asyncio.run(server.run(args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
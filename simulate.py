@@ -0,0 +1,180 @@
+# simulate.py Headless Monte Carlo simulation of Napoleon at St. Helena
+'''
+Play many numbered deals without the Tk interface, spread over a pool of
+worker processes, to estimate how often the game can be won.
+
+One line per deal (deal number, won, first pass win, moves, elapsed seconds) is
+streamed to a CSV file as results arrive, and the number of deals per
+second is reported on stderr.  The games themselves can be archived
+in the format of records.py.
+
+    python simulate.py --deals 100000 --policy greedy --out results.csv
+    python simulate.py --deals 100000 --record games.rec
+
+A policy is a function policy(model, moves, rng) that chooses one of the
+legal moves offered to it.  New policies are registered in POLICIES.
+'''
+import argparse, csv, multiprocessing, random, sys, time
+from model import Model, TABLEAU, FOUNDATIONS, WASTE, NEXTPASS
+import records
+from solver import Solver, WON
+
+MAXMOVES = 1000      # abandon a deal after this many moves
+SOLVERNODES = 200000 # node budget for the solver policy
+REPORT = 5.0         # seconds between progress reports
+
+def usefulMoves(model, moves):
+    '''
+    Remove the moves that can only lead back to an earlier position:
+    splitting a tableau sequence that is already built on its successor,
+    and moving an entire tableau pile to an empty one.  What remains can
+    never loop, so every game played with them comes to an end.
+    '''
+    piles = model.piles
+    answer = []
+    for move in moves:
+        source, count, dest = move
+        if source in TABLEAU and dest in TABLEAU:
+            pile = piles[source]
+            if count == len(pile):
+                if piles[dest].isEmpty():
+                    continue
+            elif pile[-count-1] > pile[-count]:
+                continue
+        answer.append(move)
+    return answer
+
+def randomPolicy(model, moves, rng):
+    return rng.choice(moves)
+
+def greedyPolicy(model, moves, rng):
+    '''
+    Play to the foundations whenever possible, then build on the tableau,
+    and only turn the stock when there is nothing better to do.
+    '''
+    piles = model.piles
+    def score(move):
+        source, count, dest = move
+        if move == NEXTPASS:
+            return 0
+        if dest in FOUNDATIONS:
+            return 5
+        if dest == WASTE:
+            return 1
+        if piles[dest].isEmpty():
+            return 2
+        if source in TABLEAU:
+            return 4 if count < len(piles[source]) else 3
+        return 4
+    return max(moves, key=score)
+
+_plan = {'game' : None, 'moves' : None}
+
+def solverPolicy(model, moves, rng):
+    '''
+    Solve the deal once, at its first move, and follow the winning line.
+    If the solver finds no win within SOLVERNODES, play greedily.
+    '''
+    if _plan['game'] != model.games:
+        result = Solver(maxNodes=SOLVERNODES).solve(model)
+        _plan['game'] = model.games
+        _plan['moves'] = list(reversed(result.moves)) if result.status == WON else None
+    if _plan['moves']:
+        return _plan['moves'].pop()
+    return greedyPolicy(model, moves, rng)
+
+POLICIES = {
+    'random' : randomPolicy,
+    'greedy' : greedyPolicy,
+    'solver' : solverPolicy,
+}
+
+def playDeal(model, seed, policy):
+    '''
+    Play the deal numbered seed to the end.
+    Return (seed, won, first pass win, moves, elapsed seconds).
+    '''
+    start = time.perf_counter()
+    model.deal(seed)
+    rng = random.Random(seed)
+    moves = 0
+    while moves < MAXMOVES and not model.win():
+        legal = usefulMoves(model, model.legalMoves())
+        if not legal:
+            break
+        model.play(policy(model, legal, rng))
+        moves += 1
+    won = model.win()
+    return seed, won, won and model.passNumber == 1, moves, time.perf_counter() - start
+
+# Each worker process builds one model and reuses it for all its deals.
+
+_model = None
+_policy = None
+_record = False
+
+def _initWorker(policyName, record=False):
+    global _model, _policy, _record
+    _model = Model(0, 0, 0)
+    _policy = POLICIES[policyName]
+    _record = record
+
+def _playDeal(seed):
+    result = playDeal(_model, seed, _policy)
+    if _record:
+        return result + (records.pack(_model.history()), _model.passNumber)
+    return result
+
+def simulate(seeds, policyName, outfile, processes=None, chunksize=64, report=sys.stderr,
+             archive=None):
+    '''
+    Play each deal number in seeds with the named policy, writing one CSV row per
+    deal to outfile, and the games to archive (a records.GameWriter) if
+    given.  Return (deals, wins, first pass wins, seconds).
+    '''
+    writer = csv.writer(outfile)
+    writer.writerow(('deal', 'won', 'first', 'moves', 'elapsed'))
+    deals = wins = first = 0
+    start = last = time.perf_counter()
+    with multiprocessing.Pool(processes, _initWorker, (policyName, archive is not None)) as pool:
+        for result in pool.imap_unordered(_playDeal, seeds, chunksize):
+            seed, won, firstPass, moves, elapsed = result[:5]
+            if archive is not None:
+                archive.writeGame(seed, won, result[6], result[5])
+            writer.writerow((seed, int(won), int(firstPass), moves, '%.6f'%elapsed))
+            deals += 1
+            wins += won
+            first += firstPass
+            now = time.perf_counter()
+            if report and now - last >= REPORT:
+                last = now
+                print('%d deals, %.0f deals/second'%(deals, deals/(now-start)), file=report)
+    return deals, wins, first, time.perf_counter() - start
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Simulate Napoleon at St. Helena deals.')
+    parser.add_argument('--deals', type=int, default=10000, help='number of deals to play')
+    parser.add_argument('--start', type=int, default=0, help='number of the first deal')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='greedy')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--chunksize', type=int, default=64, help='deals handed to a worker at a time')
+    parser.add_argument('--out', default='simulation.csv', help='CSV file for per-deal results')
+    parser.add_argument('--record', default=None, help='archive file the games are added to')
+    args = parser.parse_args(argv)
+    seeds = range(args.start, args.start + args.deals)
+    archive = None
+    if args.record:
+        archive = records.GameWriter(open(args.record, 'ab'))
+    try:
+        with open(args.out, 'w', newline='') as outfile:
+            deals, wins, first, seconds = simulate(seeds, args.policy, outfile,
+                                                   args.processes, args.chunksize, archive=archive)
+    finally:
+        if archive is not None:
+            archive.close()
+    print('%d deals in %.1f seconds, %.0f deals/second'%(deals, seconds, deals/seconds))
+    if deals:
+        print('won %d (%.2f%%), first pass %d (%.2f%%)'%(wins, 100*wins/deals, first, 100*first/deals))
+
+if __name__ == "__main__":
+    main()
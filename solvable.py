@@ -0,0 +1,251 @@
+# solvable.py Precomputed solvability of numbered deals of Napoleon at St. Helena
+'''
+An index file holds one fixed-size record for each deal number from 0
+up, saying what the solver found for that deal:
+
+    status      0 not solved yet, 1 won, 2 lost, 3 budget ran out
+    first       0 not known, 1 winnable without the second pass, 2 not
+    length      moves in the winning line (at most 65535)
+    nodes       positions searched (at most 2**32-1)
+
+The file is used through mmap, so opening it costs nothing however many
+deals it holds, and looking up a deal reads just its record.  Picking a
+deal of some kind probes records at random, which takes a few tries
+when deals of that kind are common.
+
+The index is filled by a batch job that solves the deals on a process
+pool.  Records are written as results arrive and unsolved deals have
+status 0, so a job that is stopped can simply be run again and carries
+on where it left off, and several jobs given separate ranges of deals
+may fill the same file at once.  The file is only ever made longer,
+never shorter, and only under a lock, since the other jobs have it
+mapped.
+
+    python solvable.py deals.idx --count 100000            # solve deals 0 to 99999
+    python solvable.py deals.idx --start 50000 --count 50000 --processes 4
+    python solvable.py deals.idx --summary
+'''
+import mmap, multiprocessing, os, random, struct, sys, time, zlib
+try:
+    import fcntl
+except ImportError:         # Windows
+    fcntl = None
+    import msvcrt
+from model import Model, NEXTPASS
+from solver import Solver, TranspositionTable, WON, LOST, UNKNOWN
+from cache import RULES
+
+MAGIC = b'NAPX'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')     # magic, version, record size, rules checksum, records
+RECORD = struct.Struct('<BBHI')       # status, first, length, nodes
+
+STATUSES = (None, WON, LOST, UNKNOWN)
+CODES = {status : code for code, status in enumerate(STATUSES) if status}
+FIRST_UNKNOWN, FIRST_YES, FIRST_NO = 0, 1, 2
+
+NODES = 500000       # node budget for each deal
+HARD = 100000        # a winnable deal that took this many nodes is hard
+TRIES = 10000        # random probes before giving up on finding a deal
+
+def lockFile(f):
+    '''
+    Take an exclusive lock on the open file f, waiting for it if need be.
+    '''
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+def unlockFile(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class SolvableIndex:
+    '''
+    The index file at path, which is created (or made longer) to hold
+    at least count records if count is given.
+    '''
+    def __init__(self, path, count=None):
+        rules = zlib.crc32(RULES.encode())
+        if count is None and not os.path.exists(path):
+            raise FileNotFoundError(path)
+        # another job may be making the file too, so it is never truncated
+        self.file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0)), 'r+b')
+        lockFile(self.file)
+        try:
+            self.file.seek(0)
+            header = self.file.read(HEADER.size)
+            if not header and count is not None:
+                header = HEADER.pack(MAGIC, VERSION, RECORD.size, rules, 0)
+                self.file.write(header)
+            try:
+                magic, version, size, checksum, records = HEADER.unpack(header)
+            except struct.error:
+                raise ValueError('%s is not a deal index'%path)
+            if magic != MAGIC or version != VERSION or size != RECORD.size:
+                raise ValueError('%s is not a deal index'%path)
+            if checksum != rules:
+                raise ValueError('%s was made under other rules'%path)
+            if count is not None and count > records:
+                self.file.truncate(HEADER.size + count * RECORD.size)
+                self.file.seek(0)
+                self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, rules, count))
+                records = count
+            self.file.flush()
+        finally:
+            unlockFile(self.file)
+        self.count = records
+        self.map = mmap.mmap(self.file.fileno(), HEADER.size + records * RECORD.size)
+
+    def __len__(self):
+        return self.count
+
+    def get(self, number):
+        '''
+        Return (status, first, length, nodes) for deal  number, with
+        status None if the deal has not been solved.
+        '''
+        code, first, length, nodes = RECORD.unpack_from(self.map, HEADER.size + number * RECORD.size)
+        return STATUSES[code], first, length, nodes
+
+    def set(self, number, status, first, length, nodes):
+        RECORD.pack_into(self.map, HEADER.size + number * RECORD.size,
+                         CODES[status], first, min(length, 0xFFFF), min(nodes, 0xFFFFFFFF))
+
+    def unsolved(self, start=0, stop=None):
+        '''
+        Generate the numbers of the deals from start up to stop that have
+        not been solved.
+        '''
+        stop = self.count if stop is None else min(stop, self.count)
+        data = self.map
+        for number in range(start, stop):
+            if data[HEADER.size + number * RECORD.size] == 0:
+                yield number
+
+    def pick(self, wanted, rng=random, tries=TRIES):
+        '''
+        Return the number of a deal chosen at random among those whose
+        record satisfies  wanted(status, first, length, nodes), or None
+        if none turned up in the given number of tries.
+        '''
+        if not self.count:
+            return None
+        for k in range(tries):
+            number = rng.randrange(self.count)
+            if wanted(*self.get(number)):
+                return number
+        return None
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+def winnable(status, first, length, nodes):
+    return status == WON
+
+def hard(status, first, length, nodes):
+    '''
+    Winnable, but not on the first pass, and only after a long search.
+    '''
+    return status == WON and first != FIRST_YES and nodes >= HARD
+
+# The batch job.  Each worker keeps its solver's table of lost positions
+# from one deal to the next, since a proof holds whatever deal the
+# position came from.
+
+_model = None
+_table = None
+_budget = None
+
+def _initWorker(maxNodes, maxSeconds):
+    global _model, _table, _budget
+    _model = Model(0, 0, 0)
+    _table = TranspositionTable(22)
+    _budget = maxNodes, maxSeconds
+
+def _solveDeal(number):
+    maxNodes, maxSeconds = _budget
+    _model.deal(number)
+    result = Solver(maxNodes, maxSeconds, table=_table).solve(_model)
+    nodes = result.nodes
+    first = FIRST_UNKNOWN
+    if result.status == LOST:
+        first = FIRST_NO
+    elif result.status == WON:
+        if NEXTPASS not in result.moves:
+            first = FIRST_YES
+        else:
+            onePass = Solver(maxNodes, maxSeconds, table=_table, firstPass=True).solve(_model)
+            nodes += onePass.nodes
+            first = {WON : FIRST_YES, LOST : FIRST_NO}.get(onePass.status, FIRST_UNKNOWN)
+    return number, result.status, first, len(result.moves), nodes
+
+def build(path, start, count, processes=None, maxNodes=NODES, maxSeconds=None,
+          chunksize=4, report=sys.stderr):
+    '''
+    Solve the deals numbered from start to start+count-1 that the index at
+    path does not have yet, and record them.  Return the number solved.
+    '''
+    index = SolvableIndex(path, start + count)
+    todo = list(index.unsolved(start, start + count))
+    done = 0
+    begun = last = time.perf_counter()
+    try:
+        with multiprocessing.Pool(processes, _initWorker, (maxNodes, maxSeconds)) as pool:
+            for number, status, first, length, nodes in pool.imap_unordered(_solveDeal, todo, chunksize):
+                index.set(number, status, first, length, nodes)
+                done += 1
+                now = time.perf_counter()
+                if report and now - last >= 5.0:
+                    last = now
+                    index.flush()
+                    print('%d of %d deals, %.1f deals/second'%(done, len(todo), done/(now-begun)),
+                          file=report)
+    finally:
+        index.close()
+    return done
+
+def summary(index):
+    '''
+    Return counts of the deals by status, and of the first pass wins.
+    '''
+    counts = dict.fromkeys(STATUSES, 0)
+    firstPass = 0
+    for number in range(len(index)):
+        status, first, length, nodes = index.get(number)
+        counts[status] += 1
+        firstPass += first == FIRST_YES
+    return counts, firstPass
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Build an index of solvable Napoleon at St. Helena deals.')
+    parser.add_argument('path', help='index file')
+    parser.add_argument('--start', type=int, default=0, help='number of the first deal')
+    parser.add_argument('--count', type=int, default=10000, help='number of deals')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--nodes', type=int, default=NODES, help='node budget per deal')
+    parser.add_argument('--seconds', type=float, default=None, help='time budget per deal')
+    parser.add_argument('--summary', action='store_true', help='only report what the index holds')
+    args = parser.parse_args(argv)
+    if not args.summary:
+        done = build(args.path, args.start, args.count, args.processes, args.nodes, args.seconds)
+        print('solved %d deals'%done)
+    index = SolvableIndex(args.path)
+    counts, firstPass = summary(index)
+    index.close()
+    print('%d deals: %d won (%d on the first pass), %d lost, %d unknown, %d not solved'%(
+        sum(counts.values()), counts[WON], firstPass, counts[LOST], counts[UNKNOWN], counts[None]))
+
+if __name__ == "__main__":
+    main()
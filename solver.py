@@ -0,0 +1,393 @@
+# solver.py Solver for Napoleon at St. Helena
+'''
+Depth-first search for a winning line from any position, following the
+rules in model.py exactly: supermoves limited by the number of empty
+tableau piles as in Model.canDrop and TableauPile.drop, and a single
+extra pass through the stock as in Model.nextPass.
+
+The search works on the piles of a state.State, unpacked into
+bytearrays, and makes and unmakes moves in place.  Each position is
+hashed incrementally with Zobrist keys, one random 64-bit key for each
+(card, pile, position in pile).  The two cards of the same suit and rank
+are interchangeable in play, so keys are chosen by FACE, not by code.
+
+Positions that have been searched to the end without finding a win are
+stored in a TranspositionTable of fixed size, where a new entry simply
+replaces whatever occupied its slot.  Moves between tableau piles can be
+undone, so the positions form a graph with cycles.  A position is only
+stored once it is known to be lost no matter how it was reached; the
+strongly connected components of the graph are tracked as in Tarjan's
+algorithm, and a whole component is stored when its root is finished.
+Thus the table only ever holds proofs, and can be shared between
+searches (see parallel.py).
+
+A search can be given a budget of nodes and of seconds, and reports
+how many nodes it searched and how often the table was useful.  While
+it runs it remembers the line that has put the most cards on the
+foundations so far, for when the budget runs out first.
+
+Results can be kept from one run to the next in a cache.SolverCache.
+
+    python solver.py 17                     # solve deal 17
+    python solver.py --cache cache.db 17    # solve it once only
+'''
+import random, time
+from array import array
+from state import State, FACE, NEXT, RANK, PILES
+from model import ACE, TABLEAU, FOUNDATIONS, STOCK, WASTE, NEXTPASS
+
+WON = 'won'
+LOST = 'lost'
+UNKNOWN = 'unknown'      # the budget ran out first
+
+MAXDEPTH = 104           # no pile can hold more cards than this
+CHECK = 1023             # look at the clock and stop flag every CHECK+1 nodes
+
+def _makeKeys(seed=20180101):
+    rng = random.Random(seed)
+    return array('Q', (rng.getrandbits(64) for k in range(52*PILES*MAXDEPTH)))
+
+ZOBRIST = _makeKeys()          # indexed by (face*PILES + pile)*MAXDEPTH + position
+PASSKEY = random.Random(1815).getrandbits(64)     # xored in on the second pass
+
+def zobrist(piles, passNumber):
+    '''
+    Hash of a position given as a list of piles of card codes.
+    '''
+    h = PASSKEY if passNumber != 1 else 0
+    for n, pile in enumerate(piles):
+        for pos, code in enumerate(pile):
+            h ^= ZOBRIST[(FACE[code]*PILES + n)*MAXDEPTH + pos]
+    return h
+
+def runLength(pile):
+    '''
+    Number of cards in the descending sequence at the top of pile
+    '''
+    n = 1
+    while n < len(pile) and NEXT[pile[-n]] == FACE[pile[-n-1]]:
+        n += 1
+    return min(n, len(pile))
+
+def legalMoves(piles, passNumber):
+    '''
+    The legal moves in a position, best first, as (source, count, dest)
+    triples.  Moves to an empty pile are only generated for the first
+    empty pile, since the others lead to equivalent positions, and an
+    entire tableau pile is never moved to an empty tableau pile.
+    '''
+    empty = [n for n in TABLEAU if not piles[n]]
+    limit = 2 ** len(empty)
+    firstEmpty = empty[0] if empty else None
+    home = [n for n in FOUNDATIONS if piles[n]]
+    bare = [n for n in FOUNDATIONS if not piles[n]]
+    built = [n for n in TABLEAU if piles[n]]
+    found, build, space = [], [], []
+    for source in (WASTE, STOCK) + tuple(built):
+        pile = piles[source]
+        if not pile:
+            continue
+        longest = runLength(pile) if source < STOCK else 1
+        top = pile[-1]
+        # foundations: the top card goes first, whatever the count
+        if RANK[top] == ACE:
+            if bare:
+                for count in range(1, longest+1):
+                    found.append((source, count, bare[0]))
+        else:
+            for dest in home:
+                if NEXT[piles[dest][-1]] == FACE[top]:
+                    for count in range(1, longest+1):
+                        found.append((source, count, dest))
+                    break
+        # tableau: only one count can fit on a given card
+        for dest in built:
+            if dest == source:
+                continue
+            count = FACE[piles[dest][-1]] - FACE[top]
+            if 0 < count <= longest and count <= limit and NEXT[pile[-count]] == FACE[piles[dest][-1]]:
+                build.append((source, count, dest))
+        if firstEmpty is not None:
+            most = min(longest, limit//2)
+            if source < STOCK and most == len(pile):
+                most -= 1
+            for count in range(most, 0, -1):
+                space.append((source, count, firstEmpty))
+    moves = found + build + space
+    if piles[STOCK]:
+        moves.append((STOCK, 1, WASTE))
+    elif passNumber == 1:
+        moves.append(NEXTPASS)
+    return moves
+
+class TranspositionTable:
+    '''
+    A fixed-size table of hashes of lost positions.  Each hash has one
+    slot, and storing a hash evicts whatever was there before.
+    '''
+    def __init__(self, bits=20):
+        self.slots = array('Q', bytes(8 << bits))
+        self.mask = (1 << bits) - 1
+        self.stores = self.evictions = 0
+
+    def __contains__(self, h):
+        return self.slots[h & self.mask] == (h or 1)
+
+    def add(self, h):
+        h = h or 1
+        slot = h & self.mask
+        old = self.slots[slot]
+        if old != h:
+            if old:
+                self.evictions += 1
+            self.slots[slot] = h
+            self.stores += 1
+
+    def __len__(self):
+        return len(self.slots)
+
+class Result:
+    '''
+    Outcome of a search.  moves is the winning line, if one was found.
+    '''
+    def __init__(self, status, moves, nodes, seconds, hits, table, best=None):
+        self.status = status
+        self.moves = moves
+        self.best = moves if status == WON else (best or [])  # line with most cards home
+        self.nodes = nodes
+        self.seconds = seconds
+        self.hits = hits
+        self.stores = table.stores
+        self.evictions = table.evictions
+
+    def nodesPerSecond(self):
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return '%s in %d moves: %d nodes, %.2f s, %.0f nodes/s, %d table hits, %d stores, %d evictions'%(
+            self.status, len(self.moves), self.nodes, self.seconds, self.nodesPerSecond(),
+            self.hits, self.stores, self.evictions)
+
+class Search:
+    '''
+    Piles being searched, with their Zobrist hash kept up to date as
+    moves are made and unmade.
+    '''
+    def __init__(self, piles, passNumber):
+        self.piles = piles
+        self.passNumber = passNumber
+        self.hash = zobrist(piles, passNumber)
+        self.home = sum(len(piles[n]) for n in FOUNDATIONS)
+
+    def make(self, move):
+        piles, h = self.piles, self.hash
+        if move == NEXTPASS:
+            self.turnOver(piles[WASTE], piles[STOCK], WASTE, STOCK)
+            self.passNumber += 1
+            self.hash ^= PASSKEY
+            return
+        source, count, dest = move
+        src, dst = piles[source], piles[dest]
+        base = len(src) - count
+        cards = src[base:]
+        del src[base:]
+        if dest in FOUNDATIONS:
+            cards.reverse()
+            self.home += count
+        pos = len(dst)
+        for k in range(count):
+            face = FACE[cards[k]]
+            h ^= ZOBRIST[(face*PILES + source)*MAXDEPTH + base + (count-1-k if dest in FOUNDATIONS else k)]
+            h ^= ZOBRIST[(face*PILES + dest)*MAXDEPTH + pos + k]
+        dst.extend(cards)
+        self.hash = h
+
+    def unmake(self, move):
+        piles, h = self.piles, self.hash
+        if move == NEXTPASS:
+            self.turnOver(piles[STOCK], piles[WASTE], STOCK, WASTE)
+            self.passNumber -= 1
+            self.hash ^= PASSKEY
+            return
+        source, count, dest = move
+        src, dst = piles[source], piles[dest]
+        pos = len(dst) - count
+        cards = dst[pos:]
+        del dst[pos:]
+        if dest in FOUNDATIONS:
+            cards.reverse()
+            self.home -= count
+        base = len(src)
+        for k in range(count):
+            face = FACE[cards[k]]
+            h ^= ZOBRIST[(face*PILES + source)*MAXDEPTH + base + k]
+            h ^= ZOBRIST[(face*PILES + dest)*MAXDEPTH + pos + (count-1-k if dest in FOUNDATIONS else k)]
+        src.extend(cards)
+        self.hash = h
+
+    def turnOver(self, src, dst, source, dest):
+        '''
+        Move all of src onto dst in reverse order, as Model.nextPass does.
+        '''
+        h = self.hash
+        n = len(src)
+        for pos, code in enumerate(src):
+            face = FACE[code]
+            h ^= ZOBRIST[(face*PILES + source)*MAXDEPTH + pos]
+            h ^= ZOBRIST[(face*PILES + dest)*MAXDEPTH + n-1-pos]
+        dst[:] = src[::-1]
+        del src[:]
+        self.hash = h
+
+    def won(self):
+        return self.home == 104
+
+class Solver:
+    '''
+    Search a position for a win, within an optional budget of nodes and
+    seconds.  If stop is given, it is called from time to time and the
+    search gives up when it returns True.  If progress is given, it is 
+    called with the best line so far whenever that changes.  The 
+    transposition table may be shared by several solvers, one after 
+    another.  If cache (a cache.SolverCache) is given, results are 
+    looked up in it first and stored in it afterwards.  If firstPass is
+    True, only wins without turning the stock over again are looked for.
+    '''
+    def __init__(self, maxNodes=None, maxSeconds=None, tableBits=20, table=None, stop=None,
+                 progress=None, cache=None, firstPass=False):
+        self.maxNodes = maxNodes
+        self.maxSeconds = maxSeconds
+        self.table = table if table is not None else TranspositionTable(tableBits)
+        self.stop = stop
+        self.progress = progress
+        self.cache = cache
+        self.firstPass = firstPass
+        self.best = []
+
+    def solve(self, position):
+        '''
+        position is a Model or a State.  Return a Result.
+        '''
+        deal = None
+        if not isinstance(position, State):
+            if not position.undoStack:
+                deal = position.number
+            position = State.fromModel(position)
+        if self.firstPass and position.passNumber == 1:
+            # The rules differ from the second pass only in allowing the
+            # next pass, so this is the same search as from the position
+            # on the second pass, and can share its proofs and cache.
+            position = position.copy()
+            position.data[0] = 2
+            deal = None
+        self.best = []
+        if self.cache is not None:
+            result = self.cache.get(position, self.maxNodes, self.maxSeconds)
+            if result is not None:
+                self.best = result.best
+                return result
+        search = Search(position.piles(), position.passNumber)
+        start = time.perf_counter()
+        status, moves, nodes, hits = self.search(search, start)
+        result = Result(status, moves, nodes, time.perf_counter() - start, hits, self.table, self.best)
+        # a search that was called off says nothing about its budget
+        if self.cache is not None and not (self.stop is not None and self.stop()):
+            self.cache.put(position, result, deal, self.maxNodes, self.maxSeconds)
+        return result
+
+    def outOfBudget(self, nodes, start):
+        if self.maxNodes is not None and nodes >= self.maxNodes:
+            return True
+        if self.maxSeconds is not None and time.perf_counter() - start >= self.maxSeconds:
+            return True
+        return self.stop is not None and self.stop()
+
+    def search(self, search, start):
+        '''
+        Iterative depth-first search.  Return (status, moves, nodes, hits).
+        '''
+        table = self.table
+        if search.won():
+            return WON, [], 0, 0
+        if search.hash in table:
+            return LOST, [], 0, 1
+        nodes = hits = 0
+        counter = 0
+        bestHome = search.home
+        onStack = {search.hash : 0}   # positions in unfinished components, with their index
+        component = [search.hash]     # Tarjan's stack
+        path = []                     # moves from the root
+        # a frame is [hash, moves, next move, index, lowest index reached]
+        frames = [[search.hash, legalMoves(search.piles, search.passNumber), 0, 0, 0]]
+        while frames:
+            frame = frames[-1]
+            moves = frame[1]
+            if frame[2] < len(moves):
+                move = moves[frame[2]]
+                frame[2] += 1
+                search.make(move)
+                nodes += 1
+                h = search.hash
+                if search.won():
+                    path.append(move)
+                    return WON, path, nodes, hits
+                if search.home > bestHome:
+                    bestHome = search.home
+                    self.best = path + [move]
+                    if self.progress is not None:
+                        self.progress(self.best)
+                if h in table:
+                    hits += 1
+                elif h in onStack:
+                    frame[4] = min(frame[4], onStack[h])
+                elif nodes & CHECK == 0 and self.outOfBudget(nodes, start):
+                    return UNKNOWN, [], nodes, hits
+                else:
+                    counter += 1
+                    onStack[h] = counter
+                    component.append(h)
+                    path.append(move)
+                    frames.append([h, legalMoves(search.piles, search.passNumber), 0, counter, counter])
+                    continue
+                search.unmake(move)
+            else:
+                frames.pop()
+                if frame[4] == frame[3]:
+                    while True:
+                        h = component.pop()
+                        del onStack[h]
+                        table.add(h)
+                        if h == frame[0]:
+                            break
+                if frames:
+                    parent = frames[-1]
+                    parent[4] = min(parent[4], frame[4])
+                    search.unmake(path.pop())
+        return LOST, [], nodes, hits
+
+def main(argv=None):
+    import argparse
+    from model import Model
+    parser = argparse.ArgumentParser(description='Solve Napoleon at St. Helena deals.')
+    parser.add_argument('seeds', type=int, nargs='+', help='numbers of the deals to solve')
+    parser.add_argument('--nodes', type=int, default=None, help='node budget per deal')
+    parser.add_argument('--seconds', type=float, default=None, help='time budget per deal')
+    parser.add_argument('--table', type=int, default=20, help='log2 of transposition table slots')
+    parser.add_argument('--cache', default=None, help='database of results kept between runs')
+    args = parser.parse_args(argv)
+    cache = None
+    if args.cache:
+        from cache import SolverCache
+        cache = SolverCache(args.cache)
+    model = Model(0, 0, 0)
+    try:
+        for seed in args.seeds:
+            model.deal(seed)
+            result = Solver(args.nodes, args.seconds, args.table, cache=cache).solve(model)
+            print('%d: %r'%(seed, result))
+    finally:
+        if cache is not None:
+            cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# state.py Compact game state for Napoleon at St. Helena
+'''
+A State holds a whole position in a single bytearray, with the cards
+written as their codes (see model.Card) instead of Card objects:
+
+    data[0]         the pass number
+    data[1:21]      the number of cards in each pile, by pile number
+    data[21:125]    the cards of pile 0, then pile 1, ... then the waste
+
+States can be copied, hashed and compared cheaply, so a search can hold
+very many of them.  The stock is always face down except for its top
+card, and every other card is face up, so no face-up flags are stored.
+
+The tables below answer questions about codes without building cards.
+FACE[code] identifies the card apart from its back, so that two cards
+have the same suit and rank exactly when their faces are equal, and
+NEXT[code] is the face of the card's successor (NOFACE for a King).
+Thus a < b for cards exactly when NEXT[a] == FACE[b].
+'''
+from model import ACE, KING, CARDS
+
+PILES = 20
+HEADER = 1 + PILES
+NOFACE = 255
+
+FACE = bytes(code % 52 for code in range(104))
+RANK = bytes(code % 13 + 1 for code in range(104))
+SUIT = bytes(code % 52 // 13 for code in range(104))
+NEXT = bytes(NOFACE if RANK[code] == KING else FACE[code]+1 for code in range(104))
+PREV = bytes(NOFACE if RANK[code] == ACE else FACE[code]-1 for code in range(104))
+
+# The codes of both copies of each face, indexed by face
+CODES = tuple((face, face+52) for face in range(52))
+
+# The codes of the cards that are the successors and predecessors of each card
+SUCCESSORS = tuple(CODES[NEXT[code]] if NEXT[code] != NOFACE else () for code in range(104))
+PREDECESSORS = tuple(CODES[PREV[code]] if PREV[code] != NOFACE else () for code in range(104))
+
+class State:
+    '''
+    A position packed into a bytearray, as described above.
+    '''
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def fromPiles(cls, piles, passNumber):
+        '''
+        Pack a sequence of 20 sequences of card codes, by pile number.
+        '''
+        data = bytearray(HEADER)
+        data[0] = passNumber
+        for n, pile in enumerate(piles):
+            data[1+n] = len(pile)
+            data.extend(pile)
+        return cls(data)
+
+    @classmethod
+    def fromModel(cls, model):
+        piles = [bytes(card.code for card in pile) for pile in model.piles]
+        return cls.fromPiles(piles, model.passNumber)
+
+    def piles(self):
+        '''
+        Unpack the piles into a list of bytearrays, by pile number.
+        '''
+        data = self.data
+        answer = []
+        start = HEADER
+        for n in range(PILES):
+            end = start + data[1+n]
+            answer.append(data[start:end])
+            start = end
+        return answer
+
+    def pile(self, n):
+        data = self.data
+        start = HEADER + sum(data[1:1+n])
+        return data[start:start+data[1+n]]
+
+    @property
+    def passNumber(self):
+        return self.data[0]
+
+    def toModel(self, model):
+        '''
+        Set up model in this position.  Any move in progress is abandoned,
+        and so is the game: its journal is cleared, the recorder writes it
+        out, and the model has no deal number, since the position need
+        not be the start of a deal.
+        '''
+        if model.recorder is not None:
+            model.recorder.finish(model.win(), model.passNumber)
+        model.selection = []
+        for pile, codes in zip(model.piles, self.piles()):
+            pile.clear()
+            for code in codes:
+                pile.add(CARDS[code])
+        model.flipTop()
+        model.passNumber = self.passNumber
+        model.number = None
+        model.undoStack.clear()
+        model.redoStack.clear()
+        model.generator.reset()
+        model.changed.update(range(len(model.piles)))
+        model.relocate(range(len(model.piles)))
+        return model
+
+    def copy(self):
+        return State(bytearray(self.data))
+
+    def key(self):
+        return bytes(self.data)
+
+    def __eq__(self, other):
+        return isinstance(other, State) and self.data == other.data
+
+    def __hash__(self):
+        return hash(bytes(self.data))
+
+    def __repr__(self):
+        return 'State(%r)'%bytes(self.data)
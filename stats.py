@@ -0,0 +1,209 @@
+# stats.py Game statistics for Napoleon at St. Helena
+'''
+Every game played is appended to a small SQLite database, one row per
+deal: the number of the deal, how it ended, the number of
+passes and moves, how long it took, and the deck of cards used.  Rows
+are never changed once written.
+
+Rows are queued in memory and written in batches, each batch in one
+transaction, so a crash can lose the games still queued but never
+leaves the database half written.  The database is in write-ahead log
+mode, where a committed transaction survives the program dying.
+
+The totals shown in the status bar are kept in a table of counters that
+is updated in the same transaction as the rows, so they cost nothing to
+read however long the history.  The counters from an old napoleon.ini
+are carried over into it the first time the database is opened.  The
+other summaries (wins by period, streaks) are single SQL queries over an
+index, so the history is never loaded into Python.
+
+    python stats.py                 # totals, streaks and wins by month
+    python stats.py --period week
+'''
+import os, sqlite3, time
+
+WON = 'won'
+LOST = 'lost'               # no moves left
+ABANDONED = 'abandoned'     # a new deal, or quit, with moves left
+
+BATCH = 32                  # rows queued before they are written
+VERSION = 1                 # of the database layout
+
+PERIODS = {'day' : '%Y-%m-%d', 'week' : '%Y-W%W', 'month' : '%Y-%m', 'year' : '%Y'}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    finished REAL NOT NULL,         -- seconds since the epoch
+    seed INTEGER,
+    result TEXT NOT NULL,
+    passes INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    deck TEXT
+);
+CREATE INDEX IF NOT EXISTS gamesFinished ON games(finished);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT);
+'''
+
+class Stats:
+    '''
+    The statistics database at path.  Call close() when finished, to
+    write any games still queued.
+    '''
+    def __init__(self, path, batch=BATCH):
+        self.path = path
+        self.batch = batch
+        self.pending = []
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        with self.db:
+            self.db.executescript(SCHEMA)
+            self.db.execute('PRAGMA user_version=%d'%VERSION)
+            for name in ('games', 'wins', 'first'):
+                self.db.execute('INSERT OR IGNORE INTO counters VALUES (?, 0)', (name,))
+
+    def migrate(self, iniPath):
+        '''
+        Carry over the counters and deck from an old napoleon.ini, once.
+        Return True if anything was carried over.
+        '''
+        if self.setting('migrated') or not os.path.exists(iniPath):
+            return False
+        try:
+            with open(iniPath) as infile:
+                text = infile.readlines()
+                games, wins, first = (int(line.strip()) for line in text[:3])
+                deck = os.path.join(os.path.dirname(iniPath), text[3].strip())
+        except (IOError, ValueError, IndexError):
+            return False
+        with self.db:
+            for name, value in (('games', games), ('wins', wins), ('first', first)):
+                self.db.execute('UPDATE counters SET value = value + ? WHERE name = ?', (value, name))
+            self.db.execute('INSERT OR REPLACE INTO settings VALUES (?, ?)', ('deck', deck))
+            self.db.execute('INSERT OR REPLACE INTO settings VALUES (?, ?)', ('migrated', iniPath))
+        return True
+
+    def add(self, seed, result, passes, moves, seconds, deck=None):
+        '''
+        Queue one finished game.  The queue is written when it is full.
+        '''
+        self.pending.append((time.time(), seed, result, passes, moves, seconds, deck))
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write the queued games, and bring the counters up to date, in
+        one transaction.
+        '''
+        pending = self.pending
+        if not pending:
+            return
+        games, wins, first = self.count(pending)
+        with self.db:
+            self.db.executemany('INSERT INTO games (finished, seed, result, passes, moves, seconds, deck) '
+                                'VALUES (?, ?, ?, ?, ?, ?, ?)', pending)
+            for name, value in (('games', games), ('wins', wins), ('first', first)):
+                self.db.execute('UPDATE counters SET value = value + ? WHERE name = ?', (value, name))
+        self.pending = []
+
+    @staticmethod
+    def count(rows):
+        '''
+        Return (games, wins, first pass wins) among queued rows.
+        '''
+        wins = sum(1 for row in rows if row[2] == WON)
+        first = sum(1 for row in rows if row[2] == WON and row[3] == 1)
+        return len(rows), wins, first
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    def setting(self, name, default=None):
+        row = self.db.execute('SELECT value FROM settings WHERE name = ?', (name,)).fetchone()
+        return default if row is None else row[0]
+
+    def setSetting(self, name, value):
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO settings VALUES (?, ?)', (name, value))
+
+    # Queries.  Games still queued are written first, so they are counted.
+
+    def totals(self):
+        '''
+        Return (games, wins, first pass wins).  The games still queued
+        are counted without being written, so the status bar can ask
+        after every move.
+        '''
+        values = dict(self.db.execute('SELECT name, value FROM counters'))
+        games, wins, first = self.count(self.pending)
+        return values['games'] + games, values['wins'] + wins, values['first'] + first
+
+    def byPeriod(self, period='month', since=None):
+        '''
+        Return a list of (period, games, wins, first pass wins), oldest
+        first, of the games finished since the given time (seconds since
+        the epoch), grouped by day, week, month or year of local time.
+        '''
+        self.flush()
+        query = ('SELECT strftime(?, finished, \'unixepoch\', \'localtime\') AS period, '
+                 'count(*), sum(result = ?), sum(result = ? AND passes = 1) '
+                 'FROM games WHERE finished >= ? GROUP BY period ORDER BY period')
+        return self.db.execute(query, (PERIODS[period], WON, WON, since or 0)).fetchall()
+
+    def streaks(self):
+        '''
+        Return (current, longest) runs of games won in a row.  Games lost
+        or abandoned end a run.
+        '''
+        self.flush()
+        current = self.db.execute('SELECT count(*) FROM games WHERE id > '
+                                  '(SELECT coalesce(max(id), 0) FROM games WHERE result != ?)',
+                                  (WON,)).fetchone()[0]
+        # number the runs: within a run of equal results the difference
+        # of the two row numbers is constant
+        longest = self.db.execute('''
+            SELECT coalesce(max(length), 0) FROM
+                (SELECT count(*) AS length FROM
+                    (SELECT result, row_number() OVER (ORDER BY id) -
+                            row_number() OVER (PARTITION BY result = ? ORDER BY id) AS run
+                     FROM games)
+                 WHERE result = ? GROUP BY run)''', (WON, WON)).fetchone()[0]
+        return current, longest
+
+    def report(self, period='month', periods=12):
+        '''
+        Return a summary of the statistics as text, with the last few
+        periods of the given length.
+        '''
+        games, wins, first = self.totals()
+        current, longest = self.streaks()
+        def rate(n, d):
+            return 100.0 * n / d if d else 0.0
+        lines = ['Games %d   Wins %d (%.1f%%)   First pass wins %d (%.1f%%)'%(
+                     games, wins, rate(wins, games), first, rate(first, games)),
+                 'Winning streak %d   Longest %d'%(current, longest),
+                 '']
+        for label, n, w, f in self.byPeriod(period)[-periods:]:
+            lines.append('%-10s %6d games %6.1f%% won %6.1f%% first pass'%(label, n, rate(w, n), rate(f, n)))
+        return '\n'.join(lines)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Show Napoleon at St. Helena statistics.')
+    parser.add_argument('--db', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'napoleon.db'))
+    parser.add_argument('--period', choices=sorted(PERIODS), default='month')
+    parser.add_argument('--periods', type=int, default=12, help='number of periods shown')
+    args = parser.parse_args(argv)
+    stats = Stats(args.db)
+    try:
+        print(stats.report(args.period, args.periods))
+    finally:
+        stats.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# test_batch.py Tests of the vectorized rollouts of Napoleon at St. Helena
+import random, unittest
+from model import Model, NEXTPASS
+from state import State, PILES
+try:
+    import numpy as np
+except ImportError:
+    np = None
+else:
+    from batch import Batch, ACTIONS, PASSACTION
+
+def singleCardActions(model):
+    '''
+    The actions for the moves of one card that model allows.
+    '''
+    return {PASSACTION if move == NEXTPASS else move[0]*PILES + move[2]
+            for move in model.legalMoves() if move == NEXTPASS or move[1] == 1}
+
+@unittest.skipIf(np is None, 'needs NumPy')
+class BatchTest(unittest.TestCase):
+    def testInStepWithModel(self):
+        rng = random.Random(6)
+        numbers = list(range(20, 50))
+        batch = Batch.fromDeals(numbers)
+        models = [Model.fromDeal(number) for number in numbers]
+        active = np.ones(len(numbers), dtype=bool)
+        for k in range(300):
+            mask = batch.legal().reshape(len(numbers), ACTIONS)
+            actions = np.zeros(len(numbers), dtype=np.intp)
+            for row, model in enumerate(models):
+                if not active[row]:
+                    continue
+                legal = singleCardActions(model)
+                self.assertEqual(set(np.flatnonzero(mask[row])), legal, (numbers[row], k))
+                if not legal:
+                    active[row] = False
+                    continue
+                action = actions[row] = rng.choice(sorted(legal))
+                move = NEXTPASS if action == PASSACTION else (action // PILES, 1, action % PILES)
+                self.assertTrue(model.play(move))
+            if not active.any():
+                break
+            batch.step(actions, active)
+            for row, model in enumerate(models):
+                piles = State.fromModel(model).piles()
+                for n in range(PILES):
+                    self.assertEqual(bytes(batch.piles[row, n, :batch.lengths[row, n]]), bytes(piles[n]),
+                                     (numbers[row], k, n))
+                self.assertEqual(batch.passNumber[row], model.passNumber)
+        self.assertTrue((batch.home() == [sum(map(len, m.foundations)) for m in models]).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# test_cache.py Tests of the solver result cache for Napoleon at St. Helena
+import os, tempfile, unittest
+from cache import SolverCache, UNLIMITED, signed
+from model import Model
+from solver import Result, TranspositionTable, zobrist, LOST, UNKNOWN
+from state import State
+
+def start(number):
+    return State.fromModel(Model.fromDeal(number))
+
+def result(status, nodes=1000, seconds=1.0):
+    return Result(status, [], nodes, seconds, 0, TranspositionTable(0))
+
+class SolverCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'solutions.db')
+
+    def open(self, **kwargs):
+        cache = SolverCache(self.path, **kwargs)
+        self.addCleanup(cache.db.close)
+        return cache
+
+    def testBudgets(self):
+        cache = self.open()
+        limited, unlimited = start(1), start(2)
+        cache.put(limited, result(UNKNOWN), None, 5000, 2.0)
+        cache.put(unlimited, result(UNKNOWN), None, None, None)
+        self.assertIsNotNone(cache.get(limited, 5000, 2.0))
+        self.assertIsNotNone(cache.get(limited, 1000, 1.0))
+        self.assertIsNone(cache.get(limited, 10000, 2.0))
+        self.assertIsNone(cache.get(limited, 5000, 5.0))
+        self.assertIsNone(cache.get(limited, None, 2.0))     # no limit is more than any
+        self.assertIsNone(cache.get(limited))
+        for budget in ((None, None), (10**9, None), (None, 60.0), (1, 0.1)):
+            self.assertIsNotNone(cache.get(unlimited, *budget), budget)
+        cache.flush()
+        h = zobrist(unlimited.piles(), unlimited.passNumber)
+        self.assertEqual(cache.db.execute('SELECT nodes, seconds FROM results WHERE hash = ?',
+                                          (signed(h),)).fetchone(), (UNLIMITED, UNLIMITED))
+
+    def testFinishedResultsAlwaysDo(self):
+        cache = self.open()
+        position = start(3)
+        cache.put(position, result(LOST, nodes=10), None, 10, None)
+        self.assertEqual(cache.get(position, 10**9).status, LOST)
+        self.assertEqual(cache.get(position).status, LOST)
+
+    def testCollisionRejected(self):
+        cache = self.open(memory=0)
+        first, second = start(4), start(5)
+        cache.put(first, result(LOST), None)
+        cache.flush()
+        # make the entry for first look like the one for second
+        h1, h2 = (zobrist(s.piles(), s.passNumber) for s in (first, second))
+        with cache.db:
+            cache.db.execute('UPDATE results SET hash = ? WHERE hash = ?', (signed(h2), signed(h1)))
+        self.assertIsNone(cache.get(second))
+        self.assertIsNone(cache.get(first))
+
+    def testLeastRecentlyUsedDropped(self):
+        cache = self.open(capacity=20, memory=0)
+        positions = [start(n) for n in range(30)]
+        for position in positions[:20]:
+            cache.put(position, result(LOST), None)
+        self.assertEqual(len(cache), 20)
+        for position in positions[:5]:
+            self.assertIsNotNone(cache.get(position))
+        for position in positions[20:]:
+            cache.put(position, result(LOST), None)
+        # 30 entries: the 10 over, and a tenth of the capacity more, go
+        self.assertEqual(len(cache), 18)
+        kept = [cache.get(position) is not None for position in positions]
+        self.assertEqual(kept, [True]*5 + [False]*12 + [True]*13)
+
+    def testOtherRulesDropped(self):
+        cache = SolverCache(self.path, rules='older rules')
+        cache.put(start(6), result(LOST), 6)
+        cache.close()
+        cache = self.open()
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get(start(6)))
+        self.assertIsNone(cache.lookupDeal(6))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+# test_env.py Tests of the reinforcement learning environments of Napoleon at St. Helena
+import random, unittest
+from model import Model, NEXTPASS
+try:
+    import numpy as np
+except ImportError:
+    np = None
+else:
+    from batch import NOCARD
+    from env import NapoleonEnv, VectorEnv, OBSERVATION, TABLEAUDEPTH, moveOf, actionOf
+
+def observation(model):
+    '''
+    The observation of model's position, worked out from its piles.
+    '''
+    out = [NOCARD] * OBSERVATION
+    for n, pile in enumerate(model.tableau):
+        out[n*TABLEAUDEPTH : n*TABLEAUDEPTH + len(pile)] = [card.code for card in pile]
+    for n, pile in enumerate(model.foundations):
+        out[160 + n] = pile[-1].code if pile else NOCARD
+    out[168 : 168 + len(model.waste)] = [card.code for card in model.waste]
+    out[232] = model.stock[-1].code if model.stock else NOCARD
+    out[233] = len(model.stock)
+    out[234] = model.passNumber
+    return out
+
+def actions(model):
+    '''
+    The actions for the moves of one card that model allows.
+    '''
+    return {actionOf(move) for move in model.legalMoves() if move == NEXTPASS or move[1] == 1}
+
+@unittest.skipIf(np is None, 'needs NumPy')
+class NapoleonEnvTest(unittest.TestCase):
+    def testInStepWithModel(self):
+        rng = random.Random(7)
+        env = NapoleonEnv()
+        for number in range(5):
+            model = Model.fromDeal(number)
+            seen, info = env.reset(deal=number)
+            self.assertEqual(info['deal'], number)
+            for k in range(300):
+                self.assertEqual(list(seen), observation(model), (number, k))
+                legal = actions(model)
+                self.assertEqual(set(np.flatnonzero(info['mask'])), legal, (number, k))
+                action = rng.choice(sorted(legal))
+                home = sum(map(len, model.foundations))
+                self.assertTrue(model.play(moveOf(action)))
+                seen, reward, terminated, truncated, info = env.step(action)
+                self.assertEqual(reward, sum(map(len, model.foundations)) - home)
+                self.assertEqual(terminated, model.win() or not actions(model))
+                if terminated:
+                    break
+
+    def testIllegalAction(self):
+        env = NapoleonEnv()
+        observation, info = env.reset(deal=1)
+        illegal = int(np.flatnonzero(~info['mask'])[0])
+        with self.assertRaises(ValueError):
+            env.step(illegal)
+
+@unittest.skipIf(np is None, 'needs NumPy')
+class VectorEnvTest(unittest.TestCase):
+    def testResetAndStep(self):
+        env = VectorEnv(4, seed=1)
+        observations, info = env.reset(deals=[3, 4, 5, 6])
+        for row, number in enumerate(info['deals']):
+            model = Model.fromDeal(int(number))
+            self.assertEqual(list(observations[row]), observation(model))
+            self.assertEqual(set(np.flatnonzero(info['mask'][row])), actions(model))
+        first = info['mask'].argmax(axis=1)
+        observations, rewards, terminated, truncated, info = env.step(first)
+        for row, number in enumerate([3, 4, 5, 6]):
+            model = Model.fromDeal(number)
+            self.assertTrue(model.play(moveOf(int(first[row]))))
+            self.assertEqual(list(observations[row]), observation(model))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# test_features.py Tests of the deal features of Napoleon at St. Helena
+import unittest
+from model import Model, ACE, KING, STOCK
+try:
+    import numpy
+except ImportError:
+    numpy = None
+else:
+    from features import features, NONE
+
+def layout(model):
+    '''
+    The layout columns of features.py, worked out from the cards of model.
+    '''
+    tableau = [list(pile) for pile in model.tableau]
+    stock = list(model.piles[STOCK])[::-1]          # from the top
+    stockAces = [k for k, card in enumerate(stock) if card.rank == ACE]
+    return {
+        'topAces' : sum(pile[-1].rank == ACE for pile in tableau),
+        'buriedAces' : sum(card.rank == ACE for pile in tableau for card in pile[:-1]),
+        'aceDepth' : sum(len(pile)-1-k for pile in tableau for k, card in enumerate(pile) if card.rank == ACE),
+        'runs' : sum(pile[k] > pile[k+1] for pile in tableau for k in range(len(pile)-1)),
+        'coveringKings' : sum(card.rank == KING for pile in tableau for card in pile[1:]),
+        'stockAces' : len(stockAces),
+        'firstStockAce' : stockAces[0] if stockAces else NONE,
+        'stockAceDepth' : sum(stockAces),
+    }
+
+@unittest.skipIf(numpy is None, 'needs NumPy')
+class FeaturesTest(unittest.TestCase):
+    def testLayoutMatchesModel(self):
+        start, count = 100, 40
+        columns = features(start, count)
+        for row in range(count):
+            model = Model.fromDeal(start + row)
+            self.assertEqual(columns['deal'][row], start + row)
+            for name, value in layout(model).items():
+                self.assertEqual(columns[name][row], value, 'deal %d, %s'%(start + row, name))
+
+if __name__ == '__main__':
+    unittest.main()
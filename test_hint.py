@@ -0,0 +1,41 @@
+# test_hint.py Tests of the background hint engine for Napoleon at St. Helena
+import os, tempfile, time, unittest
+from cache import SolverCache
+from hint import HintEngine
+from model import Model
+from solver import WON
+
+def wait(engine, seconds=10.0):
+    deadline = time.monotonic() + seconds
+    while engine.running() and time.monotonic() < deadline:
+        engine.poll()
+        time.sleep(0.01)
+
+class HintEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'solutions.db')
+        self.engine = HintEngine(seconds=5.0, cache=self.path)
+
+    def tearDown(self):
+        self.engine.close()
+
+    def testHintIsLegal(self):
+        model = Model.fromDeal(2)
+        self.engine.start(model)
+        wait(self.engine)
+        self.assertEqual(self.engine.status, WON)
+        self.assertIn(self.engine.move, model.legalMoves())
+        cache = SolverCache(self.path)
+        self.assertGreater(len(cache), 0)       # the worker wrote its result
+        cache.close()
+
+    def testCloseStopsWorkers(self):
+        engine = self.engine
+        for number in range(3):
+            engine.start(Model.fromDeal(number))
+        engine.close()
+        self.assertEqual(engine.workers, [])
+        self.assertIsNone(engine.status)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# test_model.py Tests of the model of Napoleon at St. Helena
+import copy, pickle, random, unittest
+from model import Model, CARDS, NEXTPASS
+from state import State
+
+def bruteForceMoves(model):
+    '''
+    Every legal move, found by trying every selection on every pile.
+    '''
+    moves = set()
+    for source, pile in enumerate(model.piles):
+        for count in range(1, len(pile)+1):
+            if not model.grab(pile, len(pile) - count):
+                continue
+            for dest, target in enumerate(model.piles):
+                if dest != source and model.accepts(target):
+                    moves.add((source, count, dest))
+            model.abortMove()
+    if not model.stock and model.passNumber == 1:
+        moves.add(NEXTPASS)
+    return moves
+
+def playRandomly(model, rng, moves):
+    '''
+    Make up to  moves  random moves, with autoplay after some of them.
+    '''
+    for k in range(moves):
+        legal = sorted(model.legalMoves())
+        if not legal:
+            break
+        model.play(rng.choice(legal))
+        if rng.random() < 0.3:
+            model.autoplay()
+
+class MoveGeneratorTest(unittest.TestCase):
+    def testMatchesBruteForce(self):
+        rng = random.Random(3)
+        model = Model(0, 0, 0)
+        for number in range(6):
+            model.deal(number)
+            for k in range(150):
+                self.assertEqual(set(model.legalMoves()), bruteForceMoves(model), (number, k))
+                legal = sorted(model.legalMoves())
+                if not legal:
+                    break
+                if rng.random() < 0.15 and model.canUndo():
+                    model.undo()
+                else:
+                    model.play(rng.choice(legal))
+
+class JournalTest(unittest.TestCase):
+    def testUndoAllRedoAll(self):
+        rng = random.Random(4)
+        groups = 0
+        for number in range(6):
+            model = Model.fromDeal(number)
+            start = State.fromModel(model)
+            playRandomly(model, rng, 200)
+            groups += sum(isinstance(entry, list) for entry in model.undoStack)
+            end = State.fromModel(model)
+            history = list(model.history())
+            while model.undo():
+                pass
+            self.assertEqual(State.fromModel(model), start)
+            self.assertEqual(set(model.legalMoves()), bruteForceMoves(model))
+            while model.redo():
+                pass
+            self.assertEqual(State.fromModel(model), end)
+            self.assertEqual(list(model.history()), history)
+            self.assertEqual(set(model.legalMoves()), bruteForceMoves(model))
+            self.assertTrue(model.stock.faceUp(-1) or not model.stock)
+        self.assertGreater(groups, 0)       # autoplay was undone and redone
+
+class CopyTest(unittest.TestCase):
+    def testCardsStayShared(self):
+        for card in CARDS:
+            self.assertIs(pickle.loads(pickle.dumps(card)), card)
+            self.assertIs(copy.deepcopy(card), card)
+
+    def testCopiedModelPlays(self):
+        rng = random.Random(5)
+        model = Model.fromDeal(1)
+        playRandomly(model, rng, 30)
+        position = State.fromModel(model)
+        for other in (copy.deepcopy(model), pickle.loads(pickle.dumps(model))):
+            self.assertEqual(State.fromModel(other), position)
+            playRandomly(other, rng, 30)
+            self.assertEqual(set(other.legalMoves()), bruteForceMoves(other))
+            while other.undo():
+                pass
+            self.assertEqual(State.fromModel(other), State.fromModel(Model.fromDeal(1)))
+            self.assertEqual(State.fromModel(model), position)
+
+if __name__ == '__main__':
+    unittest.main()
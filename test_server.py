@@ -0,0 +1,90 @@
+# test_server.py Tests of the game server for Napoleon at St. Helena
+import asyncio, json, unittest
+from model import Model
+from server import GameServer, Connection, gameState, MAXLINE
+from solver import WON
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = GameServer(1)
+        self.addCleanup(self.server.close)
+        self.connection = Connection(self.server)
+
+    def send(self, line):
+        # as the client reads it
+        return json.loads(json.dumps(asyncio.run(self.server.reply(self.connection, line))))
+
+    def ask(self, **request):
+        reply = self.send(json.dumps(request).encode())
+        self.assertEqual(reply['id'], request.get('id'))
+        return reply
+
+    def error(self, **request):
+        reply = self.ask(**request)
+        self.assertFalse(reply['ok'], reply)
+        return reply['error']
+
+    def testPlay(self):
+        reply = self.ask(id=1, op='new', deal=17)
+        self.assertTrue(reply['ok'])
+        game = reply['game']
+        model = Model.fromDeal(17)
+        start = json.loads(json.dumps(gameState(model)))
+        self.assertEqual(reply['state'], start)
+        self.assertEqual(self.ask(id=2, op='state', game=game)['state'], start)
+        moves = self.ask(id=3, op='moves', game=game)['moves']
+        self.assertEqual(moves, [list(move) for move in sorted(model.legalMoves())])
+        reply = self.ask(id=4, op='move', game=game, move=moves[0])
+        self.assertTrue(model.play(tuple(moves[0])))
+        self.assertEqual(reply['state'], json.loads(json.dumps(gameState(model))))
+        self.assertEqual(self.ask(id=5, op='undo', game=game)['state'], start)
+        self.assertEqual(self.error(id=6, op='undo', game=game), 'nothing to undo')
+        self.assertTrue(self.ask(id=7, op='close', game=game)['ok'])
+        self.assertEqual(self.error(id=8, op='state', game=game), 'no such game')
+
+    def testSolve(self):
+        game = self.ask(id=1, op='new', deal=2)['game']
+        reply = self.ask(id=2, op='solve', game=game, nodes=100000)
+        self.assertEqual(reply['status'], WON)
+        for move in reply['moves']:
+            self.assertTrue(self.ask(op='move', game=game, move=move)['ok'])
+        self.assertTrue(self.ask(op='state', game=game)['state']['won'])
+
+    def testBadRequests(self):
+        for line in (b'{"op": "new"', b'[1, 2]', b'"new"'):
+            self.assertEqual(self.send(line), {'id' : None, 'ok' : False, 'error' : 'not a JSON object'})
+        self.assertEqual(self.error(id=1, op='fly'), 'no such game')
+        game = self.ask(op='new', deal=1)['game']
+        self.assertEqual(self.error(id=2, op='fly', game=game), "unknown op 'fly'")
+        for deal in (True, -1, 2**32, 1.0, '1'):
+            self.assertEqual(self.error(op='new', deal=deal), 'bad deal number', deal)
+        for number in (99, True, '0', None, [0]):
+            self.assertEqual(self.error(op='state', game=number), 'no such game', number)
+        for move in ([18, True, 19], [18, 1], [18, 1, 20], '18 1 19', [18.0, 1, 19]):
+            self.assertEqual(self.error(op='move', game=game, move=move), 'bad move', move)
+        self.assertEqual(self.error(op='move', game=game, move=[10, 1, 0]), 'illegal move')
+        for nodes in (0, True, 'many'):
+            self.assertEqual(self.error(op='solve', game=game, nodes=nodes), 'bad node budget', nodes)
+
+    def testOverSocket(self):
+        async def talk():
+            listener = await asyncio.start_server(self.server.serve, '127.0.0.1', 0, limit=MAXLINE)
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(b'{"id": 1, "op": "new", "deal": 3}\n{"id": 2, "op": "moves", "game": 0}\n')
+            replies = [json.loads(await reader.readline()) for k in range(2)]
+            writer.write(b'x' * (MAXLINE + 10) + b'\n')
+            replies.append(json.loads(await reader.readline()))
+            closed = await reader.readline()
+            writer.close()
+            listener.close()
+            await listener.wait_closed()
+            return replies, closed
+        replies, closed = asyncio.run(talk())
+        self.assertEqual([reply['id'] for reply in replies], [1, 2, None])
+        self.assertEqual(replies[1]['moves'], [list(move) for move in sorted(Model.fromDeal(3).legalMoves())])
+        self.assertEqual(replies[2]['error'], 'request too long')
+        self.assertEqual(closed, b'')
+
+if __name__ == '__main__':
+    unittest.main()
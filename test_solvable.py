@@ -0,0 +1,98 @@
+# test_solvable.py Tests of the index of solvable deals of Napoleon at St. Helena
+import multiprocessing, os, tempfile, unittest
+from solvable import (SolvableIndex, build, lockFile, unlockFile, HEADER, RECORD,
+                      FIRST_YES, FIRST_NO, FIRST_UNKNOWN)
+from solver import WON, LOST, UNKNOWN
+
+def _open(path, count):
+    SolvableIndex(path, count).close()
+
+class SolvableIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'deals.idx')
+
+    def size(self, count):
+        return HEADER.size + count * RECORD.size
+
+    def testRecordsRoundTrip(self):
+        records = {3 : (WON, FIRST_YES, 120, 4567), 7 : (LOST, FIRST_NO, 0, 99),
+                   8 : (UNKNOWN, FIRST_UNKNOWN, 0, 500000), 9 : (WON, FIRST_NO, 65535, 2**32-1)}
+        index = SolvableIndex(self.path, 10)
+        for number, record in records.items():
+            index.set(number, *record)
+        index.set(5, WON, FIRST_YES, 70000, 2**40)       # too big: kept at the most
+        index.close()
+        index = SolvableIndex(self.path)
+        self.addCleanup(index.close)
+        self.assertEqual(len(index), 10)
+        for number, record in records.items():
+            self.assertEqual(index.get(number), record)
+        self.assertEqual(index.get(5), (WON, FIRST_YES, 65535, 2**32-1))
+        self.assertEqual(index.get(0), (None, 0, 0, 0))
+        self.assertEqual(list(index.unsolved()), [0, 1, 2, 4, 6])
+        self.assertEqual(list(index.unsolved(2, 5)), [2, 4])
+
+    def testSmallerCountNeverTruncates(self):
+        index = SolvableIndex(self.path, 100)
+        self.addCleanup(index.close)
+        index.set(99, WON, FIRST_YES, 80, 1000)
+        index.flush()
+        other = SolvableIndex(self.path, 10)
+        self.assertEqual(len(other), 100)
+        self.assertEqual(other.get(99), (WON, FIRST_YES, 80, 1000))
+        other.close()
+        self.assertEqual(os.path.getsize(self.path), self.size(100))
+        self.assertEqual(index.get(99), (WON, FIRST_YES, 80, 1000))
+
+    def testHeaderReadUnderLock(self):
+        _open(self.path, 10)
+        with open(self.path, 'r+b') as f:
+            lockFile(f)
+            job = multiprocessing.Process(target=_open, args=(self.path, 50))
+            job.start()
+            job.join(0.5)
+            self.assertTrue(job.is_alive())       # waiting for the lock
+            # another job makes the file longer while this one waits
+            header = list(HEADER.unpack(f.read(HEADER.size)))
+            header[-1] = 400
+            f.truncate(self.size(400))
+            f.seek(0)
+            f.write(HEADER.pack(*header))
+            f.flush()
+            unlockFile(f)
+        job.join()
+        self.assertEqual(job.exitcode, 0)
+        self.assertEqual(os.path.getsize(self.path), self.size(400))
+
+    def testJobsOpeningAtOnce(self):
+        counts = [50, 400, 10, 300, 200, 5, 400, 100]
+        with multiprocessing.Pool(4) as pool:
+            pool.starmap(_open, [(self.path, count) for count in counts])
+        self.assertEqual(os.path.getsize(self.path), self.size(max(counts)))
+        index = SolvableIndex(self.path)
+        self.addCleanup(index.close)
+        self.assertEqual(len(index), max(counts))
+        self.assertEqual(list(index.unsolved()), list(range(max(counts))))
+
+    def testMissingFile(self):
+        with self.assertRaises(FileNotFoundError):
+            SolvableIndex(self.path)
+
+    def testInterruptedRangeResumes(self):
+        # a job stopped after solving some of deals 0 to 5
+        index = SolvableIndex(self.path, 6)
+        done = {0 : (LOST, FIRST_NO, 0, 12345), 2 : (WON, FIRST_YES, 99, 54321)}
+        for number, record in done.items():
+            index.set(number, *record)
+        index.close()
+        self.assertEqual(build(self.path, 0, 6, processes=1, maxNodes=2000, report=None), 4)
+        index = SolvableIndex(self.path)
+        self.addCleanup(index.close)
+        self.assertEqual(list(index.unsolved()), [])
+        for number, record in done.items():
+            self.assertEqual(index.get(number), record)
+        # run again, over a longer range: only the new deals are solved
+        self.assertEqual(build(self.path, 0, 8, processes=1, maxNodes=2000, report=None), 2)
+
+if __name__ == '__main__':
+    unittest.main()
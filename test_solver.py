@@ -0,0 +1,70 @@
+# test_solver.py Tests of the solver for Napoleon at St. Helena
+import random, unittest
+from model import Model
+from parallel import ParallelSolver
+from position import Position
+from solver import Solver, Search, legalMoves, zobrist, WON
+from state import State
+
+class WinningLines(unittest.TestCase):
+    def testLinesReplayInModel(self):
+        for number in (2, 4):
+            model = Model.fromDeal(number)
+            result = Solver(maxNodes=100000).solve(model)
+            self.assertEqual(result.status, WON, number)
+            for move in result.moves:
+                self.assertTrue(model.play(move), (number, move))
+            self.assertTrue(model.win())
+
+class IncrementalHash(unittest.TestCase):
+    def testMakeAndUnmake(self):
+        rng = random.Random(1)
+        for number in range(5):
+            state = State.fromModel(Model.fromDeal(number))
+            search = Search(state.piles(), state.passNumber)
+            start = search.hash
+            line = []
+            for k in range(200):
+                moves = legalMoves(search.piles, search.passNumber)
+                if not moves:
+                    break
+                move = rng.choice(moves)
+                search.make(move)
+                line.append(move)
+                self.assertEqual(search.hash, zobrist(search.piles, search.passNumber))
+            for move in reversed(line):
+                search.unmake(move)
+                self.assertEqual(search.hash, zobrist(search.piles, search.passNumber))
+            self.assertEqual(search.hash, start)
+            self.assertEqual(State.fromPiles(search.piles, search.passNumber), state)
+
+    def testPositions(self):
+        rng = random.Random(2)
+        model = Model.fromDeal(7)
+        position = Position.fromModel(model)
+        for k in range(300):
+            moves = position.moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            position = position.play(move)
+            self.assertTrue(model.play(move), move)
+            self.assertEqual(position.hash, zobrist(position.piles, position.passNumber))
+            self.assertEqual(position, Position.fromModel(model))
+
+class SharedBudget(unittest.TestCase):
+    def testMoreWorkersStillWin(self):
+        # the sequential solver wins deal 0 in under 50000 nodes
+        model = Model.fromDeal(0)
+        self.assertEqual(Solver(maxNodes=100000).solve(model).status, WON)
+        with ParallelSolver(2, maxNodes=200000) as solver:
+            result = solver.solve(model)
+        self.assertEqual(result.status, WON)
+        self.assertLessEqual(result.nodes, 200000 + 2*4096)
+        self.assertGreater(result.stores, 0)
+        for move in result.moves:
+            self.assertTrue(model.play(move), move)
+        self.assertTrue(model.win())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+# test_state.py Tests of the compact game state of Napoleon at St. Helena
+import io, random, unittest
+from model import Model
+from position import Position
+from records import GameWriter, readGames
+from state import State
+
+def playRandomly(model, rng, moves):
+    for k in range(moves):
+        legal = sorted(model.legalMoves())
+        if not legal:
+            break
+        model.play(rng.choice(legal))
+
+class ToModelTest(unittest.TestCase):
+    def testRoundTrip(self):
+        model = Model.fromDeal(3)
+        playRandomly(model, random.Random(1), 50)
+        state = State.fromModel(model)
+        self.assertEqual(State.fromModel(state.toModel(Model(0, 0, 0))), state)
+
+    def testUndoAfterToModel(self):
+        rng = random.Random(2)
+        other = Model.fromDeal(2)
+        playRandomly(other, rng, 30)
+        for position in (State.fromModel(other), Position.fromModel(other)):
+            model = Model.fromDeal(1)
+            playRandomly(model, rng, 30)
+            model.undo()
+            self.assertTrue(model.canUndo() and model.canRedo())
+            position.toModel(model)
+            target = State.fromModel(other)
+            self.assertFalse(model.undo())
+            self.assertFalse(model.redo())
+            self.assertEqual(State.fromModel(model), target)
+            self.assertIsNone(model.number)
+            # moves made from here can be taken back to the position
+            playRandomly(model, rng, 10)
+            while model.undo():
+                pass
+            self.assertEqual(State.fromModel(model), target)
+
+    def testRecorderFinishesGame(self):
+        archive = io.BytesIO()
+        writer = GameWriter(archive)
+        model = Model.fromDeal(5)
+        writer.attach(model)
+        playRandomly(model, random.Random(3), 20)
+        moves = list(model.history())
+        State.fromModel(Model.fromDeal(6)).toModel(model)
+        self.assertEqual(writer.games, 1)
+        archive.seek(0)
+        game, = readGames(archive)
+        self.assertEqual((game.deal, list(game.moves())), (5, moves))
+
+if __name__ == '__main__':
+    unittest.main()
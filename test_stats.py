@@ -0,0 +1,86 @@
+# test_stats.py Tests of the game statistics of Napoleon at St. Helena
+import os, tempfile, time, unittest
+from unittest import mock
+from stats import Stats, WON, LOST, ABANDONED
+
+def at(year, month, day):
+    '''
+    Seconds since the epoch at noon, local time, on the given day.
+    '''
+    return time.mktime((year, month, day, 12, 0, 0, 0, 0, -1))
+
+class StatsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'napoleon.db')
+        self.stats = self.open()
+
+    def open(self):
+        stats = Stats(self.path)
+        self.addCleanup(stats.close)
+        return stats
+
+    def add(self, result, passes=1, when=None):
+        with mock.patch('time.time', return_value=when or time.time()):
+            self.stats.add(7, result, passes, 30, 60.0, 'deck')
+
+    def testStreaks(self):
+        self.assertEqual(self.stats.streaks(), (0, 0))
+        for result in (WON, WON, LOST, WON, WON, WON, ABANDONED, WON):
+            self.add(result)
+        self.assertEqual(self.stats.streaks(), (1, 3))
+        self.add(WON)
+        self.assertEqual(self.stats.streaks(), (2, 3))
+        self.add(LOST)
+        self.assertEqual(self.stats.streaks(), (0, 3))
+
+    def testByPeriod(self):
+        for when, result, passes in ((at(2024, 1, 3), WON, 1), (at(2024, 1, 20), WON, 2),
+                                     (at(2024, 1, 31), LOST, 2), (at(2024, 2, 2), WON, 1),
+                                     (at(2025, 3, 1), ABANDONED, 1)):
+            self.add(result, passes, when)
+        self.assertEqual(self.stats.byPeriod('month'),
+                         [('2024-01', 3, 2, 1), ('2024-02', 1, 1, 1), ('2025-03', 1, 0, 0)])
+        self.assertEqual(self.stats.byPeriod('year'), [('2024', 4, 3, 2), ('2025', 1, 0, 0)])
+        self.assertEqual(self.stats.byPeriod('month', since=at(2024, 2, 1)),
+                         [('2024-02', 1, 1, 1), ('2025-03', 1, 0, 0)])
+
+    def testMigrateOnce(self):
+        ini = os.path.join(self.dir, 'napoleon.ini')
+        with open(ini, 'w') as outfile:
+            outfile.write('10\n4\n1\ncards\n')
+        self.assertTrue(self.stats.migrate(ini))
+        self.assertEqual(self.stats.totals(), (10, 4, 1))
+        self.assertEqual(self.stats.setting('deck'), os.path.join(self.dir, 'cards'))
+        self.assertFalse(self.stats.migrate(ini))
+        self.stats.close()
+        self.stats = self.open()
+        self.assertFalse(self.stats.migrate(ini))
+        self.assertEqual(self.stats.totals(), (10, 4, 1))
+
+    def testMigrateBadFile(self):
+        ini = os.path.join(self.dir, 'napoleon.ini')
+        with open(ini, 'w') as outfile:
+            outfile.write('ten\n')
+        self.assertFalse(self.stats.migrate(ini))
+        self.assertFalse(self.stats.migrate(os.path.join(self.dir, 'missing.ini')))
+        self.assertEqual(self.stats.totals(), (0, 0, 0))
+
+    def testTotals(self):
+        for result, passes in ((WON, 1), (WON, 2), (LOST, 2), (ABANDONED, 1)):
+            self.add(result, passes)
+        # the queued games are counted, but not yet written
+        self.assertEqual(self.stats.totals(), (4, 2, 1))
+        self.assertEqual(self.stats.db.execute('SELECT count(*) FROM games').fetchone()[0], 0)
+        self.stats.close()
+        self.stats = self.open()
+        self.assertEqual(self.stats.totals(), (4, 2, 1))
+        self.add(WON)
+        self.stats.flush()
+        self.assertEqual(self.stats.totals(), (5, 3, 2))
+        counted = self.stats.db.execute("SELECT count(*), sum(result = 'won'), "
+                                        "sum(result = 'won' AND passes = 1) FROM games").fetchone()
+        self.assertEqual(counted, (5, 3, 2))
+
+if __name__ == '__main__':
+    unittest.main()
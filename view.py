@@ -7,7 +7,9 @@ Thce canvas widget is used for both view and controller.
 import sys, os, itertools
 import tkinter as tk
 import tkinter.messagebox as tkmb
-from model import SUITNAMES, RANKNAMES, ALLRANKS, Card
+import tkinter.simpledialog as tksd
+from model import SUITNAMES, RANKNAMES, ALLRANKS, DEALS, Card, TABLEAU, FOUNDATIONS, STOCK, WASTE, NEXTPASS
+from hint import HintEngine
 
 # Constants determining the size and layout of cards piles.
 # Adjacent stacks are separated by MARGIN pixels
@@ -27,11 +29,74 @@ CELEBRATE = 'yellow'     # Color of "you won" message
 DEFAULT_CURSOR = 'arrow'
 SELECT_CURSOR = 'hand2'
 
+# Dragged cards are moved at most this many times a second, however
+# fast the motion events arrive.
+DRAG_FPS = 60
+
 STATUS_FONT = ('Helvetica', '14', 'normal')
 STATUS_BG = 'gray'
 
+HOVER = 'yellow'         # outline of the pile the dragged cards would drop on
+HINT = 'cyan'            # outline of the cards and pile of a hint
+HINT_POLL = 100          # milliseconds between looks at the hint engine
+
+# Cards played to the foundations by autoplay are all put there at once,
+# or, if autoplay is animated, flown there one a frame at this rate.
+AUTOPLAY_FPS = 20
+
 imageDict = {}   # hang on to images, or they may disappear!
 
+class HitIndex:
+    '''
+    The rectangles of the piles cards can be dropped on, bucketed by the
+    cells of a coarse grid, so that finding the piles under the dragged
+    cards only looks at the few piles near them.  Rectangles are given
+    as (left, top, right, bottom), and are replaced as the tableau piles
+    grow and shrink.
+    '''
+    def __init__(self, cellWidth, cellHeight):
+        self.cellWidth = cellWidth
+        self.cellHeight = cellHeight
+        self.rects = {}      # pile number -> rectangle
+        self.cells = {}      # (column, row) -> set of pile numbers
+        self.order = {}      # pile number -> rank for breaking ties
+
+    def spanned(self, left, top, right, bottom):
+        w, h = self.cellWidth, self.cellHeight
+        return itertools.product(range(left//w, right//w + 1), range(top//h, bottom//h + 1))
+
+    def set(self, n, rect):
+        old = self.rects.get(n)
+        if old == rect:
+            return
+        if old is not None:
+            for cell in self.spanned(*old):
+                self.cells[cell].discard(n)
+        self.rects[n] = rect
+        self.order.setdefault(n, len(self.order))
+        for cell in self.spanned(*rect):
+            self.cells.setdefault(cell, set()).add(n)
+
+    def candidates(self, west, north, east, south):
+        '''
+        Numbers of the piles the box overlaps, in decreasing order of
+        overlap.  An edge of the box must lie within the pile.
+        '''
+        near = set()
+        for cell in self.spanned(west, north, east, south):
+            near.update(self.cells.get(cell, ()))
+        overlaps = []
+        for n in near:
+            left, top, right, bottom = self.rects[n]
+            if not (left <= west <= right or left <= east <= right ):
+                continue
+            if not (top <= north <= bottom or top <= south <= bottom):
+                continue
+            overlapX = min(right, east) - max(left, west)
+            overlapY = min(south, bottom) - max(north, top)
+            overlaps.append((-overlapX * overlapY, self.order[n], n))
+        return [n for _, _, n in sorted(overlaps)]
+
 class View: 
     '''
     Cards are represented as canvas image items,  displaying either the face
@@ -39,10 +104,11 @@ class View:
     crucial, since only canvas items tagged "card" will respond to mouse
     clicks.
     '''
-    def __init__(self, parent, quit, deck, **kwargs):
+    def __init__(self, parent, quit, deck, fps=DRAG_FPS, **kwargs):
         # kwargs passed to Canvas
         # quit is function to call when main window is closed
         # deck is directory with card images
+        # fps is the frame rate for dragging cards
         self.parent = parent          # parent is the Napoleon application
         self.model =  parent.model
         self.root = root = tk.Tk()
@@ -55,6 +121,16 @@ class View:
         root.title("Napoleon at St. Helena Solitaire")
         self.menu = tk.Menu(root)         # parent constructs actual menu         
         root.config(menu=self.menu)                         
+        self.drawn = {}          # code -> (x, y, index in pile, image) as last drawn
+        self.statusText = {}     # label -> text last shown
+        self.floating = []       # codes of the cards being dragged
+        self.frameTime = max(1, 1000//fps)   # milliseconds between drag frames
+        self.frameJob = None     # pending call of flushDrag
+        self.pendingX = self.pendingY = 0    # motion not yet applied to the cards
+        self.autoplay = tk.BooleanVar(value=True)     # play safe cards to the foundations
+        self.animate = tk.BooleanVar(value=False)     # show them going one at a time
+        self.replaying = []      # (code, x, y) of cards still to fly to the foundations
+        self.replayJob = None    # pending call of replayFrame
         status = self.makeStatus()
         canvas = self.canvas = tk.Canvas(root, bg=BACKGROUND, cursor=DEFAULT_CURSOR, **kwargs)
         status.pack(expand=tk.NO, fill = tk.X, side=tk.BOTTOM)
@@ -66,6 +142,12 @@ class View:
         canvas.tag_bind("card", '<ButtonPress-1>', self.onClick)
         canvas.bind('<B1-Motion>', self.drag)
         canvas.bind('<ButtonRelease-1>', self.onDrop)
+        root.bind('<Control-z>', self.undo)
+        root.bind('<Control-y>', self.redo)
+        root.bind('<h>', self.hint)
+        self.hints = HintEngine()
+        self.hintWanted = False   # show the hint when the engine has one
+        self.hintPoll = None      # pending call of pollHint
         self.makeButtons()
         self.hideMessages()
         self.show()
@@ -109,9 +191,12 @@ class View:
         self.stock = (x,y)   # NW corner of stock
         x += 2*MARGIN + CARDWIDTH
         self.waste = (x, y) #NW corner of waste
-        self.grabPiles = [self.waste, self.stock]  # reflects model.grabPiles
-        self.grabPiles.extend(self.tableau)
-        self.dropPiles = [self.waste] + self.tableau + self.foundations
+        # NW corner and horizontal offset of each pile, by model pile number
+        self.pileViews = [(t, OFFSET) for t in self.tableau] + [(f, 0) for f in self.foundations]
+        self.pileViews.extend([(self.stock, 0), (self.waste, 0)])
+        self.hits = HitIndex(CARDWIDTH, CARDHEIGHT)
+        for n in itertools.chain([WASTE], TABLEAU, FOUNDATIONS):
+            self.setHitRect(n, 1)
         canvas = self.canvas
         for w in self.tableau:
             canvas.create_rectangle(w[0]+2, w[1]+2, w[0]+CARDWIDTH-2, w[1]+CARDHEIGHT-2, outline = OUTLINE)    
@@ -126,7 +211,22 @@ class View:
                            text='Next\nPass', fill = 'Black', anchor=tk.CENTER, font = ('Helvetica', '20', 'normal'),
                            tags = ('stock', 'pass2Text'))
         canvas.tag_bind('stock', '<ButtonRelease-1>', self.turnStock)
+        canvas.create_rectangle(0, 0, CARDWIDTH, CARDHEIGHT, outline=HOVER, width=3,
+                                state=tk.HIDDEN, tag='hover')
+        for tag in ('hintFrom', 'hintTo'):
+            canvas.create_rectangle(0, 0, CARDWIDTH, CARDHEIGHT, outline=HINT, width=3,
+                                    state=tk.HIDDEN, tags=('hint', tag))
+        self.hover = None        # number of the pile outlined
         
+    def setHitRect(self, n, cards):
+        '''
+        Set the drop target rectangle of pile number n, which holds
+        the given number of cards.
+        '''
+        (left, top), xOffset = self.pileViews[n]
+        right = left + (max(cards, 1)-1)*xOffset + CARDWIDTH - 1
+        bottom = top + CARDHEIGHT - 1
+        self.hits.set(n, (left, top, right, bottom))
         
     def makeStatus(self):
         status = tk.Frame(self.root, bg = STATUS_BG) 
@@ -136,6 +236,8 @@ class View:
                                      relief = tk.RIDGE, font = STATUS_FONT, bg = STATUS_BG, fg = 'Black', bd = 2)
         self.first = tk.Label(status, 
                                              relief = tk.RIDGE, font = STATUS_FONT, bg = STATUS_BG, fg = 'Black', bd = 2)        
+        self.dealNumber = tk.Label(status, 
+                                   relief = tk.RIDGE, font = STATUS_FONT, bg = STATUS_BG, fg = 'Black', bd = 2)
         self.passNumber =   tk.Label(status, 
                                      relief = tk.RIDGE, font = STATUS_FONT, bg = STATUS_BG, fg = 'Black', bd = 2)
         self.tableauCards =  tk.Label(status, 
@@ -149,6 +251,7 @@ class View:
         self.games.pack(expand=tk.NO, fill = tk.NONE, side = tk.LEFT) 
         self.wins.pack(expand=tk.NO, fill = tk.NONE, side = tk.LEFT) 
         self.first.pack(expand=tk.NO, fill = tk.NONE, side = tk.LEFT)  
+        self.dealNumber.pack(expand=tk.NO, fill = tk.NONE, side = tk.LEFT)
         self.passNumber.pack(expand=tk.NO, fill = tk.NONE, side = tk.RIGHT)
         self.tableauCards.pack(expand=tk.NO, fill = tk.NONE, side = tk.RIGHT)
         self.foundationCards.pack(expand=tk.NO, fill = tk.NONE, side = tk.RIGHT)
@@ -168,7 +271,10 @@ class View:
             canvas.tag_unbind('stock', '<ButtonRelease-1>')
             canvas.itemconfigure('pass2Text', fill='orange')             
                 
-    def newDeal(self, event):
+    def newDeal(self, event=None, number=None):
+        '''
+        Deal number  number, or a random deal if it is None.
+        '''
         if not self.model.gameOver():
             answer = tkmb.askokcancel(title='Abandon Game?', 
                                               message= 'Game is not over.  You still have moves.',
@@ -176,11 +282,23 @@ class View:
                                               default = tkmb.CANCEL )
             if not answer: return   # user chose 'Cancel'
         canvas = self.canvas
+        self.finishReplay()
         self.activateStock()
         self.hideMessages()
-        self.model.deal()
+        self.parent.recordGame()
+        self.model.deal(number)
+        self.positionChanged()
         self.show()
         
+    def chooseDeal(self, event=None):
+        '''
+        Ask for the number of a deal, and deal it.
+        '''
+        number = tksd.askinteger('Play Deal', 'Deal number (0 to %d):'%(DEALS-1),
+                                 parent=self.root, minvalue=0, maxvalue=DEALS-1)
+        if number is not None:
+            self.newDeal(number=number)
+
     def makeMessages(self, width, height):
         canvas = self.canvas
         canvas.create_text(width//2, height//2, text = "YOU WIN",
@@ -225,68 +343,94 @@ class View:
             canvas.addtag_withtag('code%d'%card.code, c)
             
     def showPile(self, pileView, pileModel, xOffset, yOffset):
+        '''
+        Only the cards that have moved or turned over since they were last
+        drawn are redrawn.  Once one card of the pile has moved, all the 
+        cards above it are raised too, to keep them stacked in order.
+        '''
         x,y = pileView
         canvas = self.canvas
-        for card in pileModel:
+        drawn = self.drawn
+        moved = False
+        for idx, card in enumerate(pileModel):
             tag = 'code%d'%card.code
-            canvas.coords(tag, x, y)
-            if card.faceUp():
+            if pileModel.faceUp(idx):
                 foto = imageDict[card.rank, card.suit]
-                x += xOffset
-                y += yOffset
             else:
                 foto = imageDict[card.back]
-                x += xOffset
-                y += yOffset
-            canvas.itemconfigure(tag, image = foto)
-            canvas.tag_raise(tag)
+            old = drawn.get(card.code)
+            if old is None or old[:2] != (x, y):
+                canvas.coords(tag, x, y)
+                moved = True
+            elif old[2] != idx:
+                moved = True
+            if old is None or old[3] is not foto:
+                canvas.itemconfigure(tag, image = foto)
+            if moved:
+                canvas.tag_raise(tag)
+            drawn[card.code] = (x, y, idx, foto)
+            x += xOffset
+            y += yOffset
+
+    def forget(self, codes):
+        '''
+        The cards have been moved on the canvas behind the model's back,
+        so they must be redrawn next time.
+        '''
+        for code in codes:
+            self.drawn.pop(code, None)
             
-    def showSquaredPile(self, pileView, pileModel):
-        self.showPile(pileView, pileModel, 0, 0)
-        
-    def showStatus(self):
+    def showStatus(self, changed=None):
+        '''
+        Update the status labels.  If changed is given, only the pile 
+        counts for those pile numbers are recomputed.
+        '''
         model = self.model
-        self.games.configure(text='Games %d'%model.games)
-        self.wins.configure(text='Total Wins %d'%model.wins)
-        self.first.configure(text='One Pass Wins %d'%model.first)
-        self.passNumber.configure(text='Pass %d'%model.passNumber)
-        self.wasteCards.configure(text='Waste %d'%len(model.waste))
-        self.tableauCards.configure(text='Tableau %d'%sum(len(t) for t in model.tableau))
-        self.stockCards.configure(text='Stock %d'%len(model.stock))
-        self.foundationCards.configure(text='Foundation %d'%sum(len(f) for f in model.foundations))                
+        if changed is None:
+            changed = range(len(model.piles))
+        games, wins, first = self.parent.totals()
+        self.setStatus(self.games, 'Games %d'%games)
+        self.setStatus(self.wins, 'Total Wins %d'%wins)
+        self.setStatus(self.first, 'One Pass Wins %d'%first)
+        self.setStatus(self.dealNumber, 'Deal' if model.number is None else 'Deal #%d'%model.number)
+        self.setStatus(self.passNumber, 'Pass %d'%model.passNumber)
+        if WASTE in changed:
+            self.setStatus(self.wasteCards, 'Waste %d'%len(model.waste))
+        if STOCK in changed:
+            self.setStatus(self.stockCards, 'Stock %d'%len(model.stock))
+        if any(n in TABLEAU for n in changed):
+            self.setStatus(self.tableauCards, 'Tableau %d'%sum(len(t) for t in model.tableau))
+        if any(n in FOUNDATIONS for n in changed):
+            self.setStatus(self.foundationCards, 'Foundation %d'%sum(len(f) for f in model.foundations))                
+
+    def setStatus(self, label, text):
+        if self.statusText.get(str(label)) != text:
+            self.statusText[str(label)] = text
+            label.configure(text=text)
 
     def show(self):
+        '''
+        Redraw the piles that have changed since the last call.
+        '''
         model = self.model
-        self.showStock()
-        self.showTableaux()
-        self.showFoundations()
-        self.showWaste()
+        changed = model.takeChanged()
+        for n in sorted(changed):
+            pileView, xOffset = self.pileViews[n]
+            self.showPile(pileView, model.piles[n], xOffset, 0)
+            if n in TABLEAU:
+                self.setHitRect(n, len(model.piles[n]))
         if model.win():
             tag = 'winText' if model.passNumber == 2 else 'pass1Text' 
             self.showMessage(tag)
             self.activateStock(False)
         elif model.gameOver():
             self.showMessage('gameOver')
-        self.showStatus()
+        self.showStatus(changed)
 
     def dealUp(self):
         self.model.dealUp()
         self.show()
 
-    def showTableaux(self):
-        for v, m in zip(self.tableau, self.model.tableau):
-            self.showPile(v, m, OFFSET, 0)
-            
-    def showFoundations(self):
-        for v,m in zip(self.foundations, self.model.foundations):
-            self.showSquaredPile(v,m)
-            
-    def showStock(self):
-        self.showSquaredPile(self.stock, self.model.stock)
-        
-    def showWaste(self):
-        self.showSquaredPile(self.waste, self.model.waste)
-
     def grab(self, selection, pile, mouseX, mouseY):
         '''
         Grab the cards in selection.
@@ -296,6 +440,7 @@ class View:
             return
         self.mouseX, self.mouseY = mouseX, mouseY
         west = pile[0]
+        self.floating = [card.code for card in selection]
         for card in selection:
             tag = 'code%s'%card.code
             canvas.tag_raise(tag)
@@ -303,15 +448,61 @@ class View:
         canvas.configure(cursor=SELECT_CURSOR)
         dx = 5 if mouseX - west > 10 else -5
         canvas.move('floating', dx, 5)
+        x, y = self.drawn[selection[0].code][:2]
+        self.dragBox = (x+dx, y+5, x+dx+CARDWIDTH, y+5+CARDHEIGHT)
 
     def drag(self, event):
-        try:
-            x, y = event.x, event.y
-            dx, dy = x - self.mouseX, y - self.mouseY
-            self.mouseX, self.mouseY = x, y
+        '''
+        Motion events only add up how far the mouse has moved.  The cards
+        are moved by flushDrag, at most once a frame.
+        '''
+        if not self.model.moving():
+            return
+        x, y = event.x, event.y
+        self.pendingX += x - self.mouseX
+        self.pendingY += y - self.mouseY
+        self.mouseX, self.mouseY = x, y
+        if self.frameJob is None:
+            self.frameJob = self.root.after(self.frameTime, self.flushDrag)
+
+    def flushDrag(self):
+        '''
+        Move the dragged cards by the motion accumulated since the last frame.
+        '''
+        if self.frameJob is not None:
+            self.root.after_cancel(self.frameJob)
+            self.frameJob = None
+        dx, dy = self.pendingX, self.pendingY
+        if dx or dy:
             self.canvas.move('floating', dx, dy)
-        except AttributeError:
-            pass
+            self.pendingX = self.pendingY = 0
+            west, north, east, south = self.dragBox
+            self.dragBox = (west+dx, north+dy, east+dx, south+dy)
+            self.previewDrop()
+
+    def previewDrop(self):
+        '''
+        Outline the pile the cards being dragged would drop on now.
+        '''
+        model = self.model
+        for n in self.hits.candidates(*self.dragBox):
+            if model.accepts(model.piles[n]):
+                break
+        else:
+            n = None
+        self.showHover(n)
+
+    def showHover(self, n):
+        if n == self.hover:
+            return
+        self.hover = n
+        canvas = self.canvas
+        if n is None:
+            canvas.itemconfigure('hover', state=tk.HIDDEN)
+        else:
+            canvas.coords('hover', *self.hits.rects[n])
+            canvas.itemconfigure('hover', state=tk.NORMAL)
+            canvas.tag_raise('hover')
 
     def onClick(self, event):
         '''
@@ -320,14 +511,12 @@ class View:
         '''
         model = self.model
         canvas = self.canvas
+        self.finishReplay()
         tag = [t for t in canvas.gettags('current') if t.startswith('code')][0]
         code = int(tag[4:])             # code of the card clicked
-        for mgp, vgp in zip(model.grabPiles, self.grabPiles):
-            idx = mgp.find(code)
-            if idx != -1:
-                break
-        else:       # loop else
-            return
+        number, idx = model.locate(code)
+        mgp = model.piles[number]
+        vgp = self.pileViews[number][0]
         selection = model.grab(mgp, idx)
         if selection:
             canvas.addtag_withtag('moveBase', tag)
@@ -345,36 +534,17 @@ class View:
             return
         canvas = self.canvas
         canvas.configure(cursor=DEFAULT_CURSOR)
+        self.flushDrag()
 
         try:    
             west, north, east, south = canvas.bbox('moveBase')
         except TypeError:
             self.abortMove()                 
+            return
         
-        def findDest(): 
-            overlaps = []
-            tableau = model.tableau
-            for vdp, mdp in zip(self.dropPiles, model.dropPiles):
-                left = vdp[0] 
-                top = vdp[1]
-                if mdp not in tableau:
-                    cards = 1
-                else:
-                    cards = max(len(mdp), 1)
-                right = left + (cards-1)*OFFSET + CARDWIDTH - 1
-                bottom = top + CARDHEIGHT - 1
-                if not (left <= west <= right or left <= east <= right ):
-                    continue
-                if not (top <= north <= bottom or top <= south <= bottom):
-                    continue
-                overlapX = min(right, east) - max(left, west)
-                overlapY = min(south, bottom) - max(north, top)
-                overlap = overlapX * overlapY
-                overlaps.append((overlap, mdp))
-            answer =  [s[1] for s in sorted(overlaps, reverse=True)]  
-            return answer
-        
-        for pile in findDest():
+        self.showHover(None)
+        for n in self.hits.candidates(west, north, east, south):
+            pile = model.piles[n]
             if model.canDrop(pile):
                 model.completeMove(pile)
                 self.completeMove()
@@ -384,20 +554,159 @@ class View:
         self.show()
 
     def abortMove(self):
+        self.showHover(None)
         self.model.abortMove()
+        self.forget(self.floating)
         self.show()
         self.canvas.dtag('floating', 'floating')
         self.canvas.dtag('moveBase', 'moveBase')
 
     def completeMove(self):
+        self.forget(self.floating)
+        self.playSafe()
+        self.positionChanged()
         self.show()
         self.canvas.dtag('floating', 'floating')
         self.canvas.dtag('moveBase', 'moveBase')
         
+    def undo(self, event=None):
+        if self.model.undo():
+            self.afterJournal()
+
+    def redo(self, event=None):
+        if self.model.redo():
+            self.afterJournal()
+
+    def afterJournal(self):
+        '''
+        A move has been undone or redone, which may have changed the pass
+        or taken back a win.
+        '''
+        self.finishReplay()
+        self.hideMessages()
+        self.activateStock(self.model.passNumber == 1)
+        self.positionChanged()
+        self.show()
+
+    def playSafe(self):
+        '''
+        Let the model play the safe cards to the foundations, all in one
+        go.  The next show() draws the result.  If autoplay is animated,
+        that show() is done here, and the cards played are then put back
+        where they were and flown home one a frame.
+        '''
+        if not self.autoplay.get():
+            return
+        model = self.model
+        played = model.autoplay()
+        if not played or not self.animate.get():
+            return
+        drawn = self.drawn
+        start = [drawn.get(code, (None, None))[:2] for code in played]
+        self.show()
+        canvas = self.canvas
+        self.replaying = []
+        for code, (x, y) in zip(played, start):
+            if x is None:
+                continue
+            tag = 'code%d'%code
+            canvas.coords(tag, x, y)
+            canvas.tag_raise(tag)
+            self.replaying.append((code,) + drawn[code][:2])
+        self.replayJob = self.root.after(1000//AUTOPLAY_FPS, self.replayFrame)
+
+    def replayFrame(self):
+        '''
+        Fly the next card of an animated autoplay to its foundation.
+        '''
+        self.replayJob = None
+        if not self.replaying:
+            return
+        code, x, y = self.replaying.pop(0)
+        tag = 'code%d'%code
+        self.canvas.coords(tag, x, y)
+        self.canvas.tag_raise(tag)
+        if self.replaying:
+            self.replayJob = self.root.after(1000//AUTOPLAY_FPS, self.replayFrame)
+
+    def finishReplay(self):
+        '''
+        Put any cards still flying home in their places at once.  This
+        must be done before anything else moves cards.
+        '''
+        if self.replayJob is not None:
+            self.root.after_cancel(self.replayJob)
+            self.replayJob = None
+        while self.replaying:
+            self.replayFrame()
+
+    def hint(self, event=None):
+        '''
+        Show the best move the hint engine has found.  The engine keeps 
+        looking in the background, and the hint is updated as it finds
+        better moves.
+        '''
+        model = self.model
+        if model.moving() or model.win():
+            return
+        self.hintWanted = True
+        if self.hints.status is None:
+            self.hints.start(model)
+        self.showHint()
+        if self.hintPoll is None:
+            self.pollHints()
+
+    def pollHints(self):
+        self.hintPoll = None
+        if self.hints.poll() and self.hintWanted:
+            self.showHint()
+        if self.hints.running():
+            self.hintPoll = self.root.after(HINT_POLL, self.pollHints)
+
+    def positionChanged(self):
+        '''
+        The hint in progress is out of date.  Once hints have been asked
+        for, the engine starts again on the new position, so the next 
+        hint is ready sooner.
+        '''
+        self.hintWanted = False
+        self.canvas.itemconfigure('hint', state=tk.HIDDEN)
+        if self.hints.generation:
+            self.hints.start(self.model)
+            if self.hintPoll is None:
+                self.hintPoll = self.root.after(HINT_POLL, self.pollHints)
+
+    def showHint(self):
+        '''
+        Outline the cards to move and the pile to move them to.
+        '''
+        move = self.hints.move
+        canvas = self.canvas
+        if move is None:
+            canvas.itemconfigure('hint', state=tk.HIDDEN)
+            return
+        model = self.model
+        if move == NEXTPASS:
+            source, count, dest = STOCK, 1, STOCK
+        else:
+            source, count, dest = move
+        pile = model.piles[source]
+        (x, y), xOffset = self.pileViews[source]
+        first = max(len(pile) - count, 0)
+        left = x + first*xOffset
+        right = x + (max(len(pile), 1) - 1)*xOffset + CARDWIDTH
+        canvas.coords('hintFrom', left, y, right, y + CARDHEIGHT)
+        canvas.coords('hintTo', *self.hits.rects.get(dest, (left, y, right, y + CARDHEIGHT)))
+        canvas.itemconfigure('hint', state=tk.NORMAL)
+        canvas.tag_raise('hint')
+
     def turnStock(self, event):
         canvas = self.canvas
+        self.finishReplay()
         self.model.nextPass()
         self.activateStock(False)
+        self.playSafe()
+        self.positionChanged()
         self.show()
         
                 